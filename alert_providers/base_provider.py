@@ -5,7 +5,11 @@ from utility import get_xml_from_url, get_json_from_url
 
 class BaseAlertProvider(ABC):
 
+    # How long to cache responses for when the server doesn't say,
+    # and the shortest and longest to cache them for when it does
     ttl = float(os.getenv("ALERT_TTL", 1 * 60 * 60))
+    min_ttl = float(os.getenv("ALERT_MIN_TTL", 5 * 60))
+    max_ttl = float(os.getenv("ALERT_MAX_TTL", 6 * 60 * 60))
 
     @abstractmethod
     def get_alert(self):
@@ -19,18 +23,20 @@ class BaseAlertProvider(ABC):
     def get_response_json(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for ALERT_TTL seconds.
+        Caches the response for as long as the server says, between ALERT_MIN_TTL and ALERT_MAX_TTL seconds,
+        or for ALERT_TTL seconds if it doesn't say.
         Returns the response as JSON
         """
-        return get_json_from_url(url, headers, "cache_severe_alert.json", self.ttl)
+        return get_json_from_url(url, headers, "severe_alert", self.ttl, self.min_ttl, self.max_ttl)
 
     def get_response_xml(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for ALERT_TTL seconds.
+        Caches the response for as long as the server says, between ALERT_MIN_TTL and ALERT_MAX_TTL seconds,
+        or for ALERT_TTL seconds if it doesn't say.
         Returns the response as an XML ElementTree
         """        
-        return get_xml_from_url(url, headers, "cache_severe_alert.xml", self.ttl)
+        return get_xml_from_url(url, headers, "severe_alert", self.ttl, self.min_ttl, self.max_ttl)
 
 
     
\ No newline at end of file
@@ -0,0 +1,83 @@
+"""
+Compare the band based channel separation in frame_buffer.py with the original per-pixel loop.
+Checks that both produce bit-identical planes and reports how long each one takes.
+
+Run from the project root:
+    python3 -m benchmarks.channel_separation
+"""
+import random
+import sys
+import time
+from PIL import Image, ImageDraw
+from frame_buffer import separate_channels, RED_THRESHOLD, BLACK_THRESHOLD
+
+FRAME_SIZES = [(640, 384), (800, 480)]
+
+
+def separate_channels_per_pixel(image, red_threshold=RED_THRESHOLD, black_threshold=BLACK_THRESHOLD):
+    """
+    The original display.py loop, minus its per-pixel logging. Kept as the reference implementation.
+    """
+    black = Image.new('1', (image.width, image.height), 255)
+    red = Image.new('1', (image.width, image.height), 255)
+
+    for x in range(image.width):
+        for y in range(image.height):
+            r, g, b = image.getpixel((x, y))
+            if r > g + red_threshold and r > b + red_threshold:
+                red.putpixel((x, y), 0)
+            elif r <= black_threshold and g <= black_threshold and b <= black_threshold:
+                black.putpixel((x, y), 0)
+            else:
+                black.putpixel((x, y), 255)
+                red.putpixel((x, y), 255)
+    return black, red
+
+
+def make_noise_frame(width, height, seed=1):
+    """
+    Random pixels, which exercise every branch including values right at the thresholds
+    """
+    return Image.frombytes('RGB', (width, height), random.Random(seed).randbytes(width * height * 3))
+
+
+def make_screen_frame(width, height):
+    """
+    Something resembling a real screen: white background, black text and shapes, a red highlight
+    """
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    for row in range(0, height, 40):
+        draw.text((20, row + 10), "Calendar entry at row {}".format(row), fill='black')
+        draw.line((0, row, width, row), fill=(90, 90, 90), width=2)
+    draw.ellipse((width // 2, 40, width // 2 + 120, 160), fill=(230, 20, 30))
+    draw.rectangle((40, height - 100, 240, height - 40), fill=(140, 140, 140))
+    return image
+
+
+def time_call(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main():
+    all_identical = True
+    for width, height in FRAME_SIZES:
+        for name, frame in [("noise", make_noise_frame(width, height)), ("screen", make_screen_frame(width, height))]:
+            loop_seconds, expected = time_call(separate_channels_per_pixel, frame)
+            band_seconds, actual = time_call(separate_channels, frame)
+
+            identical = all(e.tobytes() == a.tobytes() for e, a in zip(expected, actual))
+            all_identical = all_identical and identical
+
+            print("{}x{} {:<6} loop {:8.3f}s  bands {:8.4f}s  speedup {:7.1f}x  identical: {}".format(
+                width, height, name, loop_seconds, band_seconds, loop_seconds / band_seconds, identical))
+
+    if not all_identical:
+        print("Planes differ from the reference implementation")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
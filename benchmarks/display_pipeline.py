@@ -0,0 +1,83 @@
+"""
+Measure time-to-glass for the display stage on each panel version, without a panel.
+Frames go through EPDDisplay into the simulator driver, which models SPI transfer and refresh times.
+Time-to-glass is the measured host time plus the modelled panel time.
+
+Run from the project root:
+    python3 -m benchmarks.display_pipeline
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+from PIL import Image, ImageDraw
+from epd_display import EPDDisplay
+from epd_drivers.simulator import SimulatorDriver, PANEL_TIMINGS
+
+
+def make_frame(width, height, clock_text):
+    """
+    A screen-like frame where only the clock changes between cycles
+    """
+    image = Image.new('RGB', (width, height), 'white')
+    draw = ImageDraw.Draw(image)
+    draw.text((40, 30), clock_text, fill='black')
+    for row in range(120, height, 60):
+        draw.text((340, row), "Calendar entry {}".format(row), fill='black')
+    draw.rectangle((40, 120, 280, 360), fill=(220, 20, 20))
+    return image
+
+
+def run_cycles(waveshare_epd75_version, state_dir, preview_dir):
+    """
+    Push a full frame, the same frame again, and then a frame with a new clock.
+    Returns a list of (refresh, host seconds, panel seconds) for each cycle.
+    """
+    timing = PANEL_TIMINGS[waveshare_epd75_version]
+    driver = SimulatorDriver(waveshare_epd75_version, preview_dir=preview_dir)
+    epd_display = EPDDisplay(waveshare_epd75_version, driver=driver, state_dir=state_dir)
+
+    results = []
+    for clock_text in ["10:41", "10:41", "10:42"]:
+        frame = make_frame(timing.width, timing.height, clock_text)
+        panel_seconds_before = driver.panel_seconds
+
+        start = time.perf_counter()
+        refresh = epd_display.show(frame, clear_screen=False)
+        host_seconds = time.perf_counter() - start
+        results.append((refresh, host_seconds, driver.panel_seconds - panel_seconds_before))
+
+        # The image is already on the glass by the time the panel goes to sleep
+        epd_display.sleep()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--previews", action="store_true", help="write preview PNGs to simulator-preview/")
+    parser.add_argument("--max-host-seconds", type=float, default=None,
+                        help="fail if the host side of any cycle takes longer than this")
+    args = parser.parse_args()
+
+    # Let the V2 panel use partial refreshes, the others ignore this
+    os.environ["WAVESHARE_PARTIAL_REFRESH"] = "1"
+
+    too_slow = False
+    for waveshare_epd75_version in PANEL_TIMINGS:
+        with tempfile.TemporaryDirectory() as state_dir:
+            results = run_cycles(waveshare_epd75_version, state_dir, "simulator-preview" if args.previews else None)
+
+        for cycle, (refresh, host_seconds, panel_seconds) in enumerate(results, start=1):
+            print("version {:<2} cycle {} {:<7} host {:7.4f}s  panel {:7.3f}s  time-to-glass {:7.3f}s".format(
+                waveshare_epd75_version, cycle, refresh, host_seconds, panel_seconds, host_seconds + panel_seconds))
+            if args.max_host_seconds is not None and host_seconds > args.max_host_seconds:
+                too_slow = True
+
+    if too_slow:
+        print("Host time exceeded {}s".format(args.max_host_seconds))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare rendering a whole screen template every minute with the layer cache in layer_cache.py,
+which renders the static layer once and then only the parts whose values changed.
+Simulates a few minutes where only the time changes, and reports how long each render takes
+and how many pixels differ from the whole-screen render.
+
+Needs cairo, so run it on the Pi, from the project root:
+    python3 -m benchmarks.layer_render
+"""
+import os
+import sys
+import time
+import tempfile
+import argparse
+from PIL import ImageChops
+from svg_raster import rasterize_svg
+from svg_template import render_template
+from layer_cache import render_layered
+from frame_buffer import separate_channels
+from benchmarks.template_fill import TEMPLATES, make_output_dict
+
+
+def count_plane_differences(image, reference):
+    """
+    How many pixels would come out differently on the screen
+    """
+    differences = 0
+    for plane, reference_plane in zip(separate_channels(image), separate_channels(reference)):
+        differences += sum(1 for value in ImageChops.logical_xor(plane, reference_plane).getdata() if value)
+    return differences
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=int, default=3, help="number of minutes to simulate")
+    # Anti-aliased edges can round differently when a part is drawn on its own
+    parser.add_argument("--max-differences", type=int, default=100,
+                        help="fail if more screen pixels than this differ from the whole-screen render")
+    args = parser.parse_args()
+
+    output_dict = make_output_dict()
+    output_dict['ICON_SVG'] = ""
+    too_different = False
+
+    for template in TEMPLATES:
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for minute in range(args.minutes):
+                output_dict['TIME_NOW'] = "10:{:02d}".format(41 + minute)
+
+                start = time.perf_counter()
+                reference = rasterize_svg(os.path.abspath(template),
+                                          bytestring=render_template(template, output_dict, cache_dir).encode('utf-8'))
+                whole_seconds = time.perf_counter() - start
+
+                start = time.perf_counter()
+                layered = render_layered(template, output_dict, cache_dir=cache_dir)
+                layered_seconds = time.perf_counter() - start
+
+                differences = count_plane_differences(layered, reference)
+                print("{:<22} minute {}  whole {:7.3f}s  layered {:7.3f}s  differing pixels {}".format(
+                    template, minute + 1, whole_seconds, layered_seconds, differences))
+                if differences > args.max_differences:
+                    too_different = True
+
+    if too_different:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Time every stage of a screen update offline, from the recorded provider responses in benchmarks/fixtures/:
+parsing the weather, alert and calendar responses, formatting the calendar events, drawing the month calendar,
+filling in each SCREEN_LAYOUT from its compiled template, and rendering it for each panel size with the layer cache
+and as a whole, then getting the panel planes and packing the buffers with the panel driver run.py would use.
+Rendering needs cairo, and packing needs the panel library (or EPD_DRIVER=fake), each is skipped without it.
+
+Each stage is timed a few times and the median kept. The results can be written as JSON, and compared with
+an earlier run to catch regressions:
+    python3 -m benchmarks.pipeline --json benchmarks/baseline.json
+    (make some changes)
+    python3 -m benchmarks.pipeline --baseline benchmarks/baseline.json
+
+Run from the project root.
+"""
+import os
+import re
+import sys
+import json
+import time
+import logging
+import datetime
+import platform
+import argparse
+import tempfile
+import importlib
+import statistics
+from xml.etree import ElementTree as ET
+import icalendar
+import icalevents.icalevents
+from svg_template import load_template, fill_template
+from layer_cache import render_layered
+from frame_buffer import get_fingerprint
+from epd_display import get_planes, get_driver
+from epd_drivers.simulator import PANEL_TIMINGS
+from weather_providers.metno import MetNo
+from weather_providers.meteireann import MetEireann
+from alert_providers.metofficerssfeed import MetOfficeRssFeed
+from alert_providers.weathergovalerts import WeatherGovAlerts
+from calendar_providers.ics import ICSCalendar
+from calendar_providers.caldav import CalDavCalendar
+from benchmarks.template_fill import TEMPLATES, make_output_dict
+from benchmarks.display_pipeline import make_frame
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+LOCATION = (51.5077, -0.1277)
+
+# Panel sizes, from the simulated panels
+SCREEN_SIZES = sorted({(timing.width, timing.height) for timing in PANEL_TIMINGS.values()})
+
+_hour_regex = re.compile(r'\d{4}-\d\d-\d\dT\d\d:00:00Z')
+
+
+def read_fixture(filename):
+    with open(os.path.join(FIXTURES_DIR, filename), 'r', encoding='utf-8') as fixture_file:
+        return fixture_file.read()
+
+
+def move_to_this_hour(xml_text):
+    """
+    Met Éireann's forecast is looked up by the hour from now, so move the recorded hours to start at this hour
+    """
+    hours = _hour_regex.findall(xml_text)
+    if not hours:
+        return xml_text
+    recorded = datetime.datetime.strptime(hours[0], "%Y-%m-%dT%H:%M:%SZ")
+    shift = datetime.datetime.utcnow().replace(minute=0, second=0, microsecond=0) - recorded
+
+    def move(match):
+        return (datetime.datetime.strptime(match.group(), "%Y-%m-%dT%H:%M:%SZ") + shift).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return _hour_regex.sub(move, xml_text)
+
+
+def with_response(provider, json_text=None, xml_text=None):
+    """
+    Have a provider parse the recorded response instead of fetching it
+    """
+    if json_text is not None:
+        provider.get_response_json = lambda url, headers={}: json.loads(json_text)
+    if xml_text is not None:
+        provider.get_response_xml = lambda url, headers={}: ET.fromstring(xml_text)
+    return provider
+
+
+def measure(function, repeat):
+    """
+    Return the median seconds `function` takes, and its result
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def run_stages(repeat, work_dir):
+    """
+    Time every stage. Returns a dict of stage name -> median seconds, None for stages that couldn't run here.
+    """
+    stages = {}
+    calendar_script = importlib.import_module("screen-calendar-get")
+    month_script = importlib.import_module("screen-calendar-month")
+    # The scripts log at INFO when imported, keep the output to the results
+    logging.getLogger().setLevel(logging.WARNING)
+
+    metno = with_response(MetNo("benchmark", *LOCATION, "metric"), json_text=read_fixture("metno.json"))
+    stages["parse weather met.no json"], _ = measure(metno.get_weather, repeat)
+    meteireann = with_response(MetEireann(*LOCATION, "metric"), xml_text=move_to_this_hour(read_fixture("meteireann.xml")))
+    stages["parse weather met eireann xml"], _ = measure(meteireann.get_weather, repeat)
+
+    metoffice = with_response(MetOfficeRssFeed("https://example.com/feed"), xml_text=read_fixture("metoffice_alerts.xml"))
+    stages["parse alert met office rss"], _ = measure(metoffice.get_alert, repeat)
+    weathergov = with_response(WeatherGovAlerts(*LOCATION, "benchmark"), json_text=read_fixture("weathergov_alerts.json"))
+    stages["parse alert weather.gov json"], _ = measure(weathergov.get_alert, repeat)
+
+    from_date = datetime.datetime.now().astimezone()
+    to_date = from_date + datetime.timedelta(days=365)
+    ics_text = read_fixture("calendar.ics")
+    ics = ICSCalendar("https://example.com/calendar.ics", calendar_script.max_event_results, from_date, to_date)
+    stages["parse calendar ics"], events = measure(
+        lambda: ics.get_events_from_ics(icalevents.icalevents.events(string_content=ics_text, start=from_date, end=to_date)), repeat)
+    caldav_text = read_fixture("caldav_events.ics")
+    caldav = CalDavCalendar("https://example.com/dav", "benchmark", calendar_script.max_event_results, from_date, to_date)
+    stages["parse calendar caldav"], _ = measure(
+        lambda: caldav.get_events_from_components(list(icalendar.Calendar.from_ical(caldav_text).walk("VEVENT"))), repeat)
+
+    stages["get_formatted_calendar_events"], calendar_output = measure(
+        lambda: calendar_script.get_formatted_calendar_events(events), repeat)
+    stages["month calendar"], month_output = measure(month_script.get_month_output, repeat)
+
+    output_dict = {**make_output_dict(), **calendar_output, **month_output, 'ICON_SVG': ""}
+    rasterize_svg = None
+    try:
+        from svg_raster import rasterize_svg
+        rasterize_svg(bytestring=b'<svg xmlns="http://www.w3.org/2000/svg" width="1" height="1"/>', width=1, height=1)
+    except (ImportError, OSError) as e:
+        print("Skipping rendering, cairo isn't available: {}".format(str(e).splitlines()[0]))
+        rasterize_svg = None
+
+    for layout, template in enumerate(TEMPLATES, start=1):
+        template_svg_filename = os.path.abspath(template)
+        # As run.py does: the compiled template is loaded from its cache, and filled in
+        stages["fill_template layout {}".format(layout)], svg = measure(
+            lambda: fill_template(load_template(template_svg_filename, work_dir), output_dict), repeat)
+        for width, height in SCREEN_SIZES:
+            if not rasterize_svg:
+                stages["render_layered layout {} {}x{}".format(layout, width, height)] = None
+                stages["rasterize layout {} {}x{}".format(layout, width, height)] = None
+                continue
+
+            # The default, LAYER_CACHE=1: the static layer is cached, and each minute only the time changes
+            layer_dir = os.path.join(work_dir, "layers-{}-{}x{}".format(layout, width, height))
+            minutes = iter(range(10**6))
+            render_layered(template_svg_filename, output_dict, width, height, layer_dir)
+            stages["render_layered layout {} {}x{}".format(layout, width, height)], _ = measure(
+                lambda: render_layered(template_svg_filename, {**output_dict, 'TIME_NOW': "10:{:02d}".format(next(minutes) % 60)},
+                                       width, height, layer_dir), repeat)
+            # LAYER_CACHE=0, or when the layer cache can't be used
+            stages["rasterize layout {} {}x{}".format(layout, width, height)], _ = measure(
+                lambda: rasterize_svg(template_svg_filename, bytestring=svg.encode('utf-8'), width=width, height=height), repeat)
+
+    for waveshare_epd75_version, timing in PANEL_TIMINGS.items():
+        image = make_frame(timing.width, timing.height, "10:41")
+        stages["get planes version {}".format(waveshare_epd75_version)], planes = measure(
+            lambda: get_planes(image, waveshare_epd75_version), repeat)
+        stages["fingerprint version {}".format(waveshare_epd75_version)], _ = measure(lambda: get_fingerprint(*planes), repeat)
+
+        name = "pack buffers version {}".format(waveshare_epd75_version)
+        try:
+            driver = get_driver(waveshare_epd75_version)
+        except Exception as e:
+            print("Skipping {}, the panel driver isn't available: {}".format(name, str(e).splitlines()[0] if str(e) else type(e).__name__))
+            stages[name] = None
+            continue
+        stages[name], _ = measure(lambda: [driver.get_buffer(plane) for plane in planes], repeat)
+
+    return stages
+
+
+def compare(stages, baseline, tolerance, min_seconds):
+    """
+    Return the stages that got slower than the baseline by more than `tolerance` (a fraction) and `min_seconds`,
+    as a list of (stage, baseline seconds, seconds)
+    """
+    regressions = []
+    for name, seconds in stages.items():
+        before = baseline.get(name)
+        if seconds is None or before is None:
+            continue
+        if seconds > before * (1 + tolerance) and seconds - before > min_seconds:
+            regressions.append((name, before, seconds))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="number of times to time each stage")
+    parser.add_argument("--json", metavar="FILE", help="write the results as JSON to FILE, - for stdout")
+    parser.add_argument("--baseline", metavar="FILE", help="compare with the results in FILE, written by --json")
+    parser.add_argument("--tolerance", type=float, default=0.25,
+                        help="fail if a stage is this fraction slower than the baseline")
+    parser.add_argument("--min-seconds", type=float, default=0.002,
+                        help="ignore slowdowns smaller than this, they're noise")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        stages = run_stages(args.repeat, work_dir)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as baseline_file:
+            baseline = json.load(baseline_file)["stages"]
+
+    for name, seconds in stages.items():
+        line = "{:<40} {}".format(name, "skipped" if seconds is None else "{:9.2f}ms".format(seconds * 1000))
+        if baseline.get(name) and seconds is not None:
+            line += "  baseline {:9.2f}ms  {:+6.1f}%".format(baseline[name] * 1000, (seconds / baseline[name] - 1) * 100)
+        print(line)
+
+    results = {
+        "date": datetime.datetime.now().isoformat(timespec='seconds'),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "repeat": args.repeat,
+        "stages": stages,
+    }
+    if args.json == "-":
+        print(json.dumps(results, indent=2))
+    elif args.json:
+        with open(args.json, 'w', encoding='utf-8') as json_file:
+            json.dump(results, json_file, indent=2)
+
+    regressions = compare(stages, baseline, args.tolerance, args.min_seconds)
+    for name, before, seconds in regressions:
+        print("Slower than the baseline: {} {:.2f}ms -> {:.2f}ms".format(name, before * 1000, seconds * 1000))
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Compare the single pass placeholder substitution in utility.py, and the precompiled templates in svg_template.py,
+with the original str.replace per key.
+Fills screen-template.1.svg to screen-template.5.svg with a full set of weather, calendar, month and custom values,
+checks they all give the same SVG, and reports how long each one takes.
+It also checks the cases where replacing one key at a time goes wrong.
+
+Run from the project root:
+    python3 -m benchmarks.template_fill
+"""
+import sys
+import time
+import argparse
+from utility import fill_placeholders
+from svg_template import compile_template, fill_template
+
+TEMPLATES = ["screen-template.{}.svg".format(layout) for layout in range(1, 6)]
+
+
+def fill_placeholders_per_key(text, output_dict):
+    """
+    The original update_svg loop. Kept as the reference implementation.
+    """
+    for output_key in output_dict:
+        text = text.replace(output_key, output_dict[output_key])
+    return text
+
+
+def make_output_dict():
+    """
+    Values for every placeholder the scripts fill in, with 10 calendar events
+    """
+    output_dict = {
+        'LOW_ONE': "7°C",
+        'HIGH_ONE': "14°C",
+        'ICON_ONE': "partlycloudy",
+        'ICON_SVG': '<g id="partlycloudy" transform="scale(4.4)"><path d="M12,6c-3.3,0-6,2.7-6,6" /></g>',
+        'WEATHER_DESC_1': "Partly cloudy with",
+        'WEATHER_DESC_2': "light rain later",
+        'TIME_NOW_FONT_SIZE': "100px",
+        'TIME_NOW': "10:41",
+        'HOUR_NOW': "10 AM",
+        'DAY_ONE': "Oct 18, 2026",
+        'DAY_NAME': "Sunday",
+        'ALERT_MESSAGE_VISIBILITY': "visible",
+        'ALERT_MESSAGE': "Yellow warning of wind for London &amp; South East England",
+    }
+    for index in range(1, 11):
+        output_dict['CAL_DATETIME_{}'.format(index)] = "Tomorrow 9:00 AM - 10:00 AM"
+        output_dict['CAL_DATETIME_START_{}'.format(index)] = "Tomorrow 9:00 AM"
+        output_dict['CAL_DESC_{}'.format(index)] = "Event number {}".format(index)
+    output_dict['MONTH_CAL'] = '<svg id="month-cal">' + '<text x="20" y="20" fill="black">18</text>' * 35 + '</svg>'
+    output_dict['CUSTOM_SVG'] = '<svg><text x="350" y="150">Pi-hole: 12% blocked</text></svg>'
+    return output_dict
+
+
+def time_fill(function, text, output_dict, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(text, output_dict)
+    return (time.perf_counter() - start) / repeat
+
+
+def check_collisions():
+    """
+    Cases that depend on the order of the keys when they're replaced one at a time.
+    Returns a list of (description, per key output, single pass output, compiled output, expected output).
+    """
+    cases = [
+        ("CAL_DESC_1 inside CAL_DESC_10",
+         "CAL_DESC_1|CAL_DESC_10", {'CAL_DESC_1': "Dentist", 'CAL_DESC_10': "Gym"},
+         "Dentist|Gym"),
+        ("placeholder inside an event title",
+         "CAL_DESC_1|CAL_DESC_2", {'CAL_DESC_1': "Rename CAL_DESC_2", 'CAL_DESC_2': "Gym"},
+         "Rename CAL_DESC_2|Gym"),
+        ("ALERT_MESSAGE inside ALERT_MESSAGE_VISIBILITY",
+         "ALERT_MESSAGE_VISIBILITY|ALERT_MESSAGE", {'ALERT_MESSAGE': "", 'ALERT_MESSAGE_VISIBILITY': "hidden"},
+         "hidden|"),
+    ]
+    return [(description, fill_placeholders_per_key(text, values), fill_placeholders(text, values),
+             fill_template(compile_template(text), values), expected)
+            for description, text, values, expected in cases]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=200, help="number of fills to average over")
+    args = parser.parse_args()
+
+    output_dict = make_output_dict()
+    mismatch = False
+
+    for template in TEMPLATES:
+        with open(template, encoding='utf-8') as template_file:
+            text = template_file.read()
+
+        segments = compile_template(text)
+        expected = fill_placeholders_per_key(text, output_dict)
+        if expected != fill_placeholders(text, output_dict) or expected != fill_template(segments, output_dict):
+            print("{}: outputs differ".format(template))
+            mismatch = True
+
+        per_key = time_fill(fill_placeholders_per_key, text, output_dict, args.repeat)
+        single_pass = time_fill(fill_placeholders, text, output_dict, args.repeat)
+        compiled = time_fill(fill_template, segments, output_dict, args.repeat)
+        print("{:<22} {:>7} bytes  per key {:7.3f}ms  single pass {:7.3f}ms  compiled {:7.3f}ms  {:5.1f}x".format(
+            template, len(text), per_key * 1000, single_pass * 1000, compiled * 1000, per_key / compiled))
+
+    for description, per_key, single_pass, compiled, expected in check_collisions():
+        print("{:<45} per key {:<7} single pass {:<7} compiled {}".format(
+            description, "ok" if per_key == expected else "WRONG", "ok" if single_pass == expected else "WRONG",
+            "ok" if compiled == expected else "WRONG"))
+        if single_pass != expected or compiled != expected:
+            mismatch = True
+
+    if mismatch:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
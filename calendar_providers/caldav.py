@@ -1,7 +1,7 @@
 
 import pickle
 import caldav
-from utility import is_stale
+from utility import is_cache_stale
 import os
 import logging
 import datetime
@@ -27,7 +27,7 @@ class CalDavCalendar(BaseCalendarProvider):
         caldav_calendar_pickle = 'cache_caldav.pickle'
         calendar_events: list[CalendarEvent] = []
 
-        if is_stale(os.getcwd() + "/" + caldav_calendar_pickle, ttl):
+        if is_cache_stale(os.getcwd() + "/" + caldav_calendar_pickle, ttl):
             logging.debug("Pickle is stale, fetching Caldav Calendar")
 
             with caldav.DAVClient(url=self.calendar_url, username=self.username, password=self.password) as client:
@@ -41,26 +41,7 @@ class CalDavCalendar(BaseCalendarProvider):
                     for component in result.icalendar_instance.subcomponents:
                         events_data.append(component)
 
-            # Sort by start date. Since some are dates, and some are datetimes, a simple string sort works
-            events_data.sort(key=lambda x: str(x['DTSTART'].dt))
-
-            for event in events_data[0:self.max_event_results]:
-
-                # If a dtend isn't included, calculate it from the duration
-                if 'DTEND' in event:
-                    event_end = event['DTEND'].dt
-                if 'DURATION' in event:
-                    event_end = event['DTSTART'].dt + event['DURATION'].dt
-
-                all_day_event = False
-                # CalDav Calendar marks the 'end' of all-day-events as
-                # the day _after_ the last day. eg, Today's all day event ends tomorrow!
-                # So subtract a day, if the event is an all day event
-                if type(event_end) == datetime.date:
-                    event_end = event_end - datetime.timedelta(days=1)
-                    all_day_event = True
-
-                calendar_events.append(CalendarEvent(str(event['SUMMARY']), event['DTSTART'].dt, event_end, all_day_event))
+            calendar_events = self.get_events_from_components(events_data)
 
             with open(caldav_calendar_pickle, 'wb') as cal:
                 pickle.dump(calendar_events, cal)
@@ -71,3 +52,31 @@ class CalDavCalendar(BaseCalendarProvider):
             with open(caldav_calendar_pickle, 'rb') as cal:
                 calendar_events = pickle.load(cal)
                 return calendar_events
+
+    def get_events_from_components(self, events_data):
+        """
+        Convert the VEVENT components returned by the server into `CalendarEvent`s, soonest first
+        """
+        calendar_events: list[CalendarEvent] = []
+
+        # Sort by start date. Since some are dates, and some are datetimes, a simple string sort works
+        events_data.sort(key=lambda x: str(x['DTSTART'].dt))
+
+        for event in events_data[0:self.max_event_results]:
+
+            # If a dtend isn't included, calculate it from the duration
+            if 'DTEND' in event:
+                event_end = event['DTEND'].dt
+            if 'DURATION' in event:
+                event_end = event['DTSTART'].dt + event['DURATION'].dt
+
+            all_day_event = False
+            # CalDav Calendar marks the 'end' of all-day-events as
+            # the day _after_ the last day. eg, Today's all day event ends tomorrow!
+            # So subtract a day, if the event is an all day event
+            if type(event_end) == datetime.date:
+                event_end = event_end - datetime.timedelta(days=1)
+                all_day_event = True
+
+            calendar_events.append(CalendarEvent(str(event['SUMMARY']), event['DTSTART'].dt, event_end, all_day_event))
+        return calendar_events
@@ -1,6 +1,6 @@
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale
+from utility import is_cache_stale
 import os
 import logging
 import pickle
@@ -55,7 +55,7 @@ class GoogleCalendar(BaseCalendarProvider):
 
         events_result = None
 
-        if is_stale(os.getcwd() + "/" + google_calendar_pickle, ttl):
+        if is_cache_stale(os.getcwd() + "/" + google_calendar_pickle, ttl):
             logging.debug("Pickle is stale, calling the Calendar API")
 
             # Call the Calendar API
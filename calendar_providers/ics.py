@@ -1,7 +1,7 @@
 
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale
+from utility import is_cache_stale
 import os
 import logging
 import pickle
@@ -22,28 +22,11 @@ class ICSCalendar(BaseCalendarProvider):
     def get_calendar_events(self) -> list[CalendarEvent]:
         calendar_events = []
         ics_calendar_pickle = 'cache_ics.pickle'
-        if is_stale(os.getcwd() + "/" + ics_calendar_pickle, ttl):
+        if is_cache_stale(os.getcwd() + "/" + ics_calendar_pickle, ttl):
             logging.debug("Pickle is stale, fetching ICS Calendar")
 
             ics_events = icalevents.icalevents.events(self.ics_calendar_url, start=self.from_date, end=self.to_date)
-            ics_events.sort(key=lambda x: x.start.replace(tzinfo=None))
-
-            logging.debug(ics_events)
-
-            for ics_event in ics_events[0:self.max_event_results]:
-                event_end = ics_event.end
-
-                # CalDav Calendar marks the 'end' of all-day-events as
-                # the day _after_ the last day. eg, Today's all day event ends tomorrow!
-                # So subtract a day, if the event is an all day event
-                if ics_event.all_day:
-                    event_end = event_end - datetime.timedelta(days=1)
-
-                # convert to local timezone
-                event_end = ics_event.end.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-                event_start = ics_event.start.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
-
-                calendar_events.append(CalendarEvent(ics_event.summary, event_start, event_end, ics_event.all_day))
+            calendar_events = self.get_events_from_ics(ics_events)
 
             with open(ics_calendar_pickle, 'wb') as cal:
                 pickle.dump(calendar_events, cal)
@@ -53,3 +36,28 @@ class ICSCalendar(BaseCalendarProvider):
                 calendar_events = pickle.load(cal)
 
         return calendar_events
+
+    def get_events_from_ics(self, ics_events):
+        """
+        Convert the events parsed by icalevents into `CalendarEvent`s, soonest first
+        """
+        calendar_events = []
+        ics_events.sort(key=lambda x: x.start.replace(tzinfo=None))
+
+        logging.debug(ics_events)
+
+        for ics_event in ics_events[0:self.max_event_results]:
+            event_end = ics_event.end
+
+            # CalDav Calendar marks the 'end' of all-day-events as
+            # the day _after_ the last day. eg, Today's all day event ends tomorrow!
+            # So subtract a day, if the event is an all day event
+            if ics_event.all_day:
+                event_end = event_end - datetime.timedelta(days=1)
+
+            # convert to local timezone
+            event_end = ics_event.end.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
+            event_start = ics_event.start.replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
+
+            calendar_events.append(CalendarEvent(ics_event.summary, event_start, event_end, ics_event.all_day))
+        return calendar_events
@@ -1,7 +1,8 @@
 
 import datetime
 from calendar_providers.base_provider import BaseCalendarProvider, CalendarEvent
-from utility import is_stale
+from utility import is_cache_stale
+from http_session import get_session
 import os
 import logging
 import pickle
@@ -29,7 +30,8 @@ class OutlookCalendar(BaseCalendarProvider):
 
         app = msal.PublicClientApplication("3b49f0d7-201a-4b5d-b2b4-8f4c3e6c8a30",
                                            authority="https://login.microsoftonline.com/consumers",
-                                           token_cache=mscache)
+                                           token_cache=mscache,
+                                           http_client=get_session())
 
         result = None
 
@@ -74,7 +76,7 @@ class OutlookCalendar(BaseCalendarProvider):
         headers = {'Authorization': 'Bearer ' + access_token}
         endpoint_calendar_view = \
             "https://graph.microsoft.com/v1.0/me/calendars/{0}/calendarview?startdatetime={1}&enddatetime={2}&$orderby=start/dateTime&$top={3}"
-        events_data = requests.get(
+        events_data = get_session().get(
                                   endpoint_calendar_view.format(calendar_id,
                                                                 requests.utils.quote(from_date_iso),
                                                                 requests.utils.quote(to_date_iso),
@@ -85,7 +87,7 @@ class OutlookCalendar(BaseCalendarProvider):
     def get_calendar_events(self, bypass_cache=False) -> list[CalendarEvent]:
         calendar_events = []
         outlook_calendar_pickle = 'cache_outlookcalendar.pickle'
-        if bypass_cache or is_stale(os.getcwd() + "/" + outlook_calendar_pickle, ttl):
+        if bypass_cache or is_cache_stale(os.getcwd() + "/" + outlook_calendar_pickle, ttl):
             logging.debug("Cache is stale, calling the Outlook Calendar API")
 
             access_token = self.get_access_token()
@@ -6,6 +6,7 @@ import re
 from datetime import datetime
 import cairosvg
 import os
+from icon_library import get_icon_group
 
 latitude = 52.508999
 longitude = 13.553160
@@ -104,10 +105,6 @@ hourly_dataframe['european_aqi'] = hourly_european_aqi
 script_dir = os.path.dirname(os.path.abspath(__file__))
 icons_dir = os.path.join(script_dir, 'icons')
 
-def get_icon_path(icon_name):
-    """Returns full path to an icon file"""
-    return os.path.join(icons_dir, icon_name)
-
 def get_weather_icon(code):
     icons = {
         0: "climacell_clear_day.svg",
@@ -168,38 +165,6 @@ def aggregate_hourly_data(hourly_df):
     }).reset_index()
     return daily_data
 
-def load_icon(icon_info):
-    """Loads SVG file"""
-    full_path = get_icon_path(icon_info)
-
-    with open(full_path, 'r') as f:
-        svg_content = f.read()
-        return svg_content
-    
-def extract_icon_group_content(icon_content):
-    """Extracts just the <g> element and its children from icon SVG"""
-    # Find the opening <g> tag with transform
-    start = icon_content.find('<g')
-    if start == -1:
-        return ""
-    
-    # Find matching closing tag
-    depth = 1
-    pos = start + 2
-    while depth > 0 and pos < len(icon_content):
-        if icon_content.startswith('</g>', pos):
-            depth -= 1
-            pos += 4
-        elif icon_content.startswith('<g', pos):
-            depth += 1
-            pos += 2
-        else:
-            pos += 1
-    
-    if depth == 0:
-        return icon_content[start:pos]
-    return ""
-    
 def adjust_icon_scale(icon_content, new_scale=3.8):
     """Adjusts the scale in the transform attribute"""
     # Simple regex replacement for the scale
@@ -247,9 +212,7 @@ def replace_placeholders(template, data, hourly_df):
 
         # Handle icon - Simple version
         icon_info = get_weather_icon(day_data['weather_code'])
-        icon_content = load_icon(icon_info)
-
-        group_content = extract_icon_group_content(icon_content)
+        group_content = get_icon_group(os.path.splitext(icon_info)[0], icons_dir, script_dir)
         adjusted_icon = adjust_icon_scale(group_content)
         template = template.replace(f'{{ICON_CONTENT{day_num}}}', adjusted_icon)
 
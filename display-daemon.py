@@ -0,0 +1,111 @@
+import os
+import signal
+import logging
+import threading
+import socketserver
+from utility import configure_logging
+from epd_display import EPDDisplay, read_frame, daemon_socket_path
+
+configure_logging()
+
+waveshare_epd75_version = os.getenv("WAVESHARE_EPD75_VERSION", "2B")
+
+# How long, in seconds, to keep the screen awake waiting for the next frame before putting it to sleep.
+# Waveshare recommend sleeping the panel when it isn't refreshing, so the default is to sleep straight away.
+idle_sleep = float(os.getenv("DISPLAY_DAEMON_IDLE_SLEEP", 0))
+
+
+class LatestFrame:
+    """
+    Holds on to the newest frame only. Older frames that were never drawn are dropped.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.frame = None
+
+    def put(self, frame):
+        with self.condition:
+            if self.frame is not None:
+                logging.debug("Dropping a frame that was never displayed")
+            self.frame = frame
+            self.condition.notify()
+
+    def take(self, timeout=None):
+        """
+        Wait up to `timeout` seconds for a frame. Returns None if none arrived.
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.frame is not None, timeout=timeout)
+            frame, self.frame = self.frame, None
+            return frame
+
+    def has_frame(self):
+        with self.condition:
+            return self.frame is not None
+
+
+class FrameHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        try:
+            frame = read_frame(self.rfile)
+        except (ValueError, KeyError) as e:
+            logging.error("Could not read frame: {}".format(e))
+            self.wfile.write(b"error\n")
+            return
+
+        logging.info("Received a {}x{} frame".format(frame.width, frame.height))
+        self.server.latest_frame.put(frame)
+        self.wfile.write(b"queued\n")
+
+
+def draw_frames(epd_display, latest_frame):
+    while True:
+        frame = latest_frame.take(timeout=idle_sleep if epd_display.awake else None)
+
+        if frame is None:
+            epd_display.sleep()
+            continue
+
+        try:
+            epd_display.show(frame)
+        except Exception as e:
+            # Keep drawing the frames that follow, whatever went wrong with this one
+            logging.exception(e)
+
+        # Anything that arrived while drawing is shown without putting the panel to sleep in between
+        if not idle_sleep and not latest_frame.has_frame():
+            epd_display.sleep()
+
+
+def main():
+    if os.path.exists(daemon_socket_path):
+        os.remove(daemon_socket_path)
+
+    latest_frame = LatestFrame()
+    server = socketserver.ThreadingUnixStreamServer(daemon_socket_path, FrameHandler)
+    server.daemon_threads = True
+    server.latest_frame = latest_frame
+    # The server thread is a daemon thread, it goes away with the process
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Display daemon listening on {}".format(daemon_socket_path))
+
+    epd_display = EPDDisplay(waveshare_epd75_version)
+
+    # Stopping the service should put the panel to sleep, same as Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    try:
+        draw_frames(epd_display, latest_frame)
+    except KeyboardInterrupt:
+        logging.debug("Keyboard Interrupt - Exit")
+    finally:
+        server.server_close()
+        os.remove(daemon_socket_path)
+        epd_display.sleep()
+        epd_display.close()
+
+
+if __name__ == "__main__":
+    main()
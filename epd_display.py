@@ -0,0 +1,225 @@
+import os
+import json
+import socket
+import logging
+import datetime
+from PIL import Image
+from frame_buffer import separate_channels, get_fingerprint, get_changed_regions, align_region, crop_buffer
+
+# Where display-daemon.py listens for frames
+daemon_socket_path = os.getenv("DISPLAY_DAEMON_SOCKET", "display-daemon.sock")
+
+
+def get_driver(waveshare_epd75_version):
+    """
+    Return the panel driver picked by the EPD_DRIVER environment variable.
+    Defaults to the real Waveshare panel.
+    """
+    driver_name = os.getenv("EPD_DRIVER", "waveshare")
+
+    if driver_name == "fake":
+        from epd_drivers.fake import FakeDriver
+        return FakeDriver(waveshare_epd75_version)
+
+    if driver_name == "simulator":
+        from epd_drivers.simulator import SimulatorDriver
+        return SimulatorDriver(waveshare_epd75_version,
+                               preview_dir=os.getenv("EPD_SIMULATOR_PREVIEW_DIR", "simulator-preview"),
+                               realtime=os.getenv("EPD_SIMULATOR_REALTIME", "0") == "1",
+                               history=int(os.getenv("EPD_SIMULATOR_HISTORY", 0)))
+
+    from epd_drivers.waveshare import WaveshareDriver
+    return WaveshareDriver(waveshare_epd75_version)
+
+
+def is_clear_time(now=None):
+    """
+    Full screen refresh at 2 AM
+    """
+    now = now or datetime.datetime.now()
+    return now.minute == 0 and now.hour == 2
+
+
+def get_planes(image, waveshare_epd75_version):
+    """
+    Convert an `image` into the 1-bit planes this panel displays
+    """
+    if waveshare_epd75_version == "2B":
+        # Handle red color for "B" version displays
+        return separate_channels(image)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return (image.convert('1'),)
+
+
+class EPDDisplay:
+    """
+    Puts frames on the panel, doing as little work as possible:
+    identical frames are skipped, V2 panels can get partial refreshes,
+    and the panel is only initialized when it isn't already awake.
+    """
+
+    def __init__(self, waveshare_epd75_version, driver=None, state_dir="."):
+        self.waveshare_epd75_version = waveshare_epd75_version
+        self._driver = driver
+        # None while asleep, otherwise "full" or "partial" depending on how it was initialized
+        self.awake = None
+
+        # Remembers what was last pushed to the screen, per panel variant
+        self.state_filename = os.path.join(state_dir, "cache_display_{}.json".format(waveshare_epd75_version))
+        self.previous_plane_filename = os.path.join(state_dir, "cache_display_{}.png".format(waveshare_epd75_version))
+
+        # Partial refresh only redraws the parts of the screen that changed. V2 panels only.
+        self.partial_refresh = os.getenv("WAVESHARE_PARTIAL_REFRESH", "0") == "1" and waveshare_epd75_version == "2"
+        # Do a full refresh after this many partial refreshes, to get rid of ghosting
+        self.partial_refresh_limit = int(os.getenv("WAVESHARE_PARTIAL_REFRESH_LIMIT", 10))
+        # Do a full refresh if more than this fraction of the screen changed
+        self.partial_refresh_max_area = float(os.getenv("WAVESHARE_PARTIAL_REFRESH_MAX_AREA", 0.25))
+
+        self.state = self.load_state()
+
+    @property
+    def driver(self):
+        # Created on first use, so that skipped frames never touch the panel library
+        if self._driver is None:
+            self._driver = get_driver(self.waveshare_epd75_version)
+        return self._driver
+
+    def load_state(self):
+        if not os.path.isfile(self.state_filename):
+            return {}
+        try:
+            with open(self.state_filename, 'r') as state_file:
+                return json.load(state_file)
+        except ValueError:
+            logging.warning("Could not read {}, ignoring it".format(self.state_filename))
+            return {}
+
+    def save_state(self):
+        with open(self.state_filename, 'w') as state_file:
+            json.dump(self.state, state_file)
+
+    def get_planes(self, image):
+        return get_planes(image, self.waveshare_epd75_version)
+
+    def get_partial_refresh_regions(self, plane):
+        """
+        Work out which parts of the screen need redrawing, by comparing `plane` with the last one displayed.
+        Returns a list of byte-aligned regions, or None if a full refresh should be done instead.
+        """
+        if self.state.get("partial_refreshes", 0) >= self.partial_refresh_limit:
+            logging.info("Reached {} partial refreshes, doing a full refresh".format(self.partial_refresh_limit))
+            return None
+
+        if not os.path.isfile(self.previous_plane_filename):
+            return None
+
+        previous_plane = Image.open(self.previous_plane_filename).convert('1')
+        if previous_plane.size != plane.size:
+            return None
+
+        regions = [align_region(region, plane.width) for region in get_changed_regions(previous_plane, plane)]
+        changed_area = sum((right - left) * (lower - upper) for left, upper, right, lower in regions)
+        if changed_area > self.partial_refresh_max_area * plane.width * plane.height:
+            logging.info("Too much of the screen has changed for a partial refresh")
+            return None
+
+        return regions
+
+    def show(self, image, clear_screen=None):
+        """
+        Put `image` on the screen, leaving the panel awake afterwards.
+        Returns the kind of refresh that was done: "skipped", "partial" or "full".
+        """
+        if clear_screen is None:
+            clear_screen = is_clear_time()
+
+        planes = self.get_planes(image)
+        fingerprint = get_fingerprint(*planes)
+
+        if not clear_screen and self.state.get("fingerprint") == fingerprint:
+            logging.info("Image is the same as what is already on screen. Skipping refresh.")
+            return "skipped"
+
+        partial_refresh_regions = None
+        if self.partial_refresh and not clear_screen:
+            partial_refresh_regions = self.get_partial_refresh_regions(planes[0])
+
+        if partial_refresh_regions is not None and not self.driver.supports_partial:
+            logging.warning("This version of the Waveshare library does not support partial refresh")
+            partial_refresh_regions = None
+
+        if partial_refresh_regions is not None:
+            if self.awake != "partial":
+                logging.debug("Initialize screen for partial refresh")
+                self.driver.init_partial()
+                self.awake = "partial"
+
+            logging.info("Display changed regions on screen: {}".format(partial_refresh_regions))
+            buffer = self.driver.get_buffer(planes[0])
+            for region in partial_refresh_regions:
+                self.driver.display_partial(crop_buffer(buffer, planes[0].width, region), region)
+            self.state["partial_refreshes"] = self.state.get("partial_refreshes", 0) + 1
+            refresh = "partial"
+        else:
+            if self.awake != "full":
+                logging.debug("Initialize screen")
+                self.driver.init()
+                self.awake = "full"
+
+            if clear_screen:
+                logging.debug("Clear screen")
+                self.driver.clear()
+
+            logging.info("Display image on screen")
+            self.driver.display(*[self.driver.get_buffer(plane) for plane in planes])
+            self.state["partial_refreshes"] = 0
+            refresh = "full"
+
+        self.state["fingerprint"] = fingerprint
+        self.save_state()
+        if self.partial_refresh:
+            planes[0].save(self.previous_plane_filename)
+        return refresh
+
+    def sleep(self):
+        """
+        Put the panel to sleep, if it is awake
+        """
+        if self.awake:
+            logging.debug("Put screen to sleep")
+            self.driver.sleep()
+            self.awake = None
+
+    def close(self):
+        if self._driver is not None:
+            self._driver.close()
+
+
+def send_frame(image, socket_path=daemon_socket_path):
+    """
+    Hand an `image` over to display-daemon.py.
+    Returns once the daemon has queued it, not once it is on screen.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    header = json.dumps({"width": image.width, "height": image.height})
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(socket_path)
+        client.sendall(header.encode('utf-8') + b"\n" + image.tobytes())
+        client.shutdown(socket.SHUT_WR)
+        reply = client.makefile('r').readline().strip()
+
+    if reply != "queued":
+        raise IOError("Display daemon did not accept the frame: {}".format(reply))
+
+
+def read_frame(stream):
+    """
+    Read a frame sent by `send_frame` from a binary `stream`
+    """
+    header = json.loads(stream.readline())
+    size = (int(header["width"]), int(header["height"]))
+    data = stream.read(size[0] * size[1] * 3)
+    return Image.frombytes('RGB', size, data)
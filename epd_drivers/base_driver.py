@@ -0,0 +1,67 @@
+from abc import ABC, abstractmethod
+
+
+class BaseDriver(ABC):
+    """
+    The operations the display code needs from a 7.5 inch e-Paper panel.
+    Buffers are whatever `get_buffer` returns for the panel, regions are (left, upper, right, lower) tuples.
+    """
+
+    width = 800
+    height = 480
+
+    # Whether the panel can redraw a window of the screen with `display_partial`
+    supports_partial = False
+
+    @abstractmethod
+    def init(self):
+        """
+        Wake the panel up and prepare it for a full refresh
+        """
+        pass
+
+    def init_partial(self):
+        """
+        Wake the panel up and prepare it for partial refreshes
+        """
+        raise NotImplementedError("This panel does not support partial refresh")
+
+    @abstractmethod
+    def clear(self):
+        """
+        Clear the whole screen to white
+        """
+        pass
+
+    @abstractmethod
+    def get_buffer(self, plane):
+        """
+        Convert a '1' mode `plane` into the panel's buffer format
+        """
+        pass
+
+    @abstractmethod
+    def display(self, *buffers):
+        """
+        Do a full refresh with one buffer per colour plane
+        """
+        pass
+
+    def display_partial(self, buffer, region):
+        """
+        Redraw only `region` of the screen, with a `buffer` holding just that region
+        """
+        raise NotImplementedError("This panel does not support partial refresh")
+
+    @abstractmethod
+    def sleep(self):
+        """
+        Put the panel into deep sleep. It needs an init before it can be drawn to again.
+        """
+        pass
+
+    def close(self):
+        """
+        Release the GPIO and SPI resources
+        """
+        pass
@@ -0,0 +1,48 @@
+import logging
+from epd_drivers.base_driver import BaseDriver
+
+# Flips every bit of a byte
+INVERT_TABLE = bytes(255 - value for value in range(256))
+
+
+class FakeDriver(BaseDriver):
+    """
+    Stands in for the panel on machines without one.
+    Nothing is drawn, the calls made and the buffers received are kept in `calls`.
+    """
+
+    def __init__(self, waveshare_epd75_version):
+        self.waveshare_epd75_version = waveshare_epd75_version
+        if waveshare_epd75_version == "1":
+            self.width, self.height = 640, 384
+        else:
+            self.width, self.height = 800, 480
+        # Only the V2 black and white panel has a partial refresh
+        self.supports_partial = waveshare_epd75_version == "2"
+        self.calls = []
+
+    def record(self, name, *args):
+        logging.info("FakeDriver - {}".format(name))
+        self.calls.append((name, args))
+
+    def init(self):
+        self.record("init")
+
+    def init_partial(self):
+        self.record("init_partial")
+
+    def clear(self):
+        self.record("clear")
+
+    def get_buffer(self, plane):
+        # Same layout as the Waveshare library: packed rows, 1 = ink
+        return bytearray(plane.convert('1').tobytes().translate(INVERT_TABLE))
+
+    def display(self, *buffers):
+        self.record("display", *buffers)
+
+    def display_partial(self, buffer, region):
+        self.record("display_partial", buffer, region)
+
+    def sleep(self):
+        self.record("sleep")
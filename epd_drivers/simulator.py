@@ -0,0 +1,123 @@
+import os
+import glob
+import time
+import logging
+import datetime
+from typing import NamedTuple
+from PIL import Image
+from epd_drivers.fake import FakeDriver, INVERT_TABLE
+
+
+class PanelTiming(NamedTuple):
+    width: int
+    height: int
+    # Bytes sent over SPI per pixel per colour plane. The V1 panel packs 2 pixels into each byte.
+    bytes_per_pixel: float
+    planes: int
+    init_seconds: float
+    full_refresh_seconds: float
+    partial_refresh_seconds: float
+    sleep_seconds: float
+
+
+# Approximate figures from the Waveshare datasheets and the delays in their Python library
+PANEL_TIMINGS = {
+    "1": PanelTiming(640, 384, 1 / 2, 1, init_seconds=0.6, full_refresh_seconds=6.0, partial_refresh_seconds=0, sleep_seconds=0.1),
+    "2": PanelTiming(800, 480, 1 / 8, 1, init_seconds=0.4, full_refresh_seconds=5.0, partial_refresh_seconds=0.6, sleep_seconds=2.0),
+    "2B": PanelTiming(800, 480, 1 / 8, 2, init_seconds=0.4, full_refresh_seconds=16.0, partial_refresh_seconds=0, sleep_seconds=2.0),
+}
+
+# The Waveshare library runs SPI at 4MHz
+SPI_HZ = 4000000
+
+
+class SimulatorDriver(FakeDriver):
+    """
+    A FakeDriver that also models how long the real panel would take, and writes what
+    would be on the glass to PNG previews.
+    The modelled time is added up in `panel_seconds`, and only really slept when `realtime` is set.
+    Only the latest preview is kept, unless `history` is set to keep that many timestamped previews as well.
+    """
+
+    def __init__(self, waveshare_epd75_version, preview_dir="simulator-preview", realtime=False, history=0):
+        super().__init__(waveshare_epd75_version)
+        self.timing = PANEL_TIMINGS.get(waveshare_epd75_version, PANEL_TIMINGS["2"])
+        self.preview_dir = preview_dir
+        self.history = history
+        self.realtime = realtime
+        self.panel_seconds = 0.0
+        self.glass = [Image.new('1', (self.width, self.height), 255) for _ in range(self.timing.planes)]
+
+    def spend(self, name, seconds):
+        """
+        Account for `seconds` of panel time spent on the `name` operation
+        """
+        logging.debug("SimulatorDriver - {} takes {:.3f}s".format(name, seconds))
+        self.panel_seconds += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def transfer_seconds(self, pixels):
+        return pixels * self.timing.bytes_per_pixel * 8 / SPI_HZ
+
+    def init(self):
+        super().init()
+        self.spend("init", self.timing.init_seconds)
+
+    def init_partial(self):
+        super().init_partial()
+        self.spend("init_partial", self.timing.init_seconds)
+
+    def clear(self):
+        super().clear()
+        self.glass = [Image.new('1', (self.width, self.height), 255) for _ in range(self.timing.planes)]
+        self.spend("clear", self.timing.planes * self.transfer_seconds(self.width * self.height) + self.timing.full_refresh_seconds)
+
+    def display(self, *buffers):
+        super().display(*buffers)
+        self.glass = [self.to_plane(buffer, self.width, self.height) for buffer in buffers]
+        self.spend("display", len(buffers) * self.transfer_seconds(self.width * self.height) + self.timing.full_refresh_seconds)
+        self.write_preview("full")
+
+    def display_partial(self, buffer, region):
+        super().display_partial(buffer, region)
+        left, upper, right, lower = region
+        self.glass[0].paste(self.to_plane(buffer, right - left, lower - upper), (left, upper))
+        self.spend("display_partial", self.transfer_seconds((right - left) * (lower - upper)) + self.timing.partial_refresh_seconds)
+        self.write_preview("partial")
+
+    def sleep(self):
+        super().sleep()
+        self.spend("sleep", self.timing.sleep_seconds)
+
+    def to_plane(self, buffer, width, height):
+        """
+        Turn a panel buffer back into a '1' mode plane
+        """
+        return Image.frombytes('1', (width, height), bytes(buffer).translate(INVERT_TABLE))
+
+    def get_preview(self):
+        """
+        Return an RGB image of what is currently on the glass
+        """
+        preview = Image.new('RGB', (self.width, self.height), 'white')
+        preview.paste('black', mask=Image.eval(self.glass[0], lambda value: 255 - value))
+        if len(self.glass) > 1:
+            preview.paste('red', mask=Image.eval(self.glass[1], lambda value: 255 - value))
+        return preview
+
+    def write_preview(self, refresh):
+        if not self.preview_dir:
+            return
+        os.makedirs(self.preview_dir, exist_ok=True)
+        preview = self.get_preview()
+        preview.save(os.path.join(self.preview_dir, "{}-latest.png".format(self.waveshare_epd75_version)))
+        if not self.history:
+            return
+
+        timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S-%f")
+        preview.save(os.path.join(self.preview_dir, "{}-{}-{}.png".format(self.waveshare_epd75_version, timestamp, refresh)))
+        # The timestamps sort oldest first
+        previews = sorted(glob.glob(os.path.join(self.preview_dir, "{}-[0-9]*.png".format(self.waveshare_epd75_version))))
+        for filename in previews[:-self.history]:
+            os.remove(filename)
@@ -0,0 +1,54 @@
+import os
+import sys
+import logging
+from epd_drivers.base_driver import BaseDriver
+
+libdir = "./lib/e-Paper/RaspberryPi_JetsonNano/python/lib"
+if os.path.exists(libdir):
+    sys.path.append(libdir)
+
+
+class WaveshareDriver(BaseDriver):
+    """
+    Drives the real panel through the Waveshare `waveshare_epd` library
+    """
+
+    def __init__(self, waveshare_epd75_version):
+        if waveshare_epd75_version == "1":
+            from waveshare_epd import epd7in5 as epd7in5
+        elif waveshare_epd75_version == "2B":
+            from waveshare_epd import epd7in5b_V2 as epd7in5
+        else:
+            from waveshare_epd import epd7in5_V2 as epd7in5
+
+        self.epd7in5 = epd7in5
+        self.epd = epd7in5.EPD()
+        self.width = self.epd.width
+        self.height = self.epd.height
+        # Older copies of the Waveshare library don't have partial refresh
+        self.supports_partial = hasattr(self.epd, "init_part") and hasattr(self.epd, "display_Partial")
+        logging.debug("WaveshareDriver({}) - partial refresh: {}".format(waveshare_epd75_version, self.supports_partial))
+
+    def init(self):
+        self.epd.init()
+
+    def init_partial(self):
+        self.epd.init_part()
+
+    def clear(self):
+        self.epd.Clear()
+
+    def get_buffer(self, plane):
+        return self.epd.getbuffer(plane)
+
+    def display(self, *buffers):
+        self.epd.display(*buffers)
+
+    def display_partial(self, buffer, region):
+        self.epd.display_Partial(buffer, *region)
+
+    def sleep(self):
+        self.epd.sleep()
+
+    def close(self):
+        self.epd7in5.epdconfig.module_exit()
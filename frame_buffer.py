@@ -0,0 +1,122 @@
+import hashlib
+import logging
+from PIL import ImageChops
+
+# Define thresholds
+RED_THRESHOLD = 150  # Adjust based on your image
+BLACK_THRESHOLD = 150  # Adjust based on your image
+
+
+def _mask(band, predicate):
+    """
+    Map every pixel of an 'L' `band` to 255 where `predicate` holds, 0 elsewhere.
+    """
+    return band.point([255 if predicate(value) else 0 for value in range(256)])
+
+
+def separate_channels(image, red_threshold=RED_THRESHOLD, black_threshold=BLACK_THRESHOLD):
+    """
+    Split an `image` into the black and red 1-bit planes used by the "B" version displays.
+    A pixel is red when its red component beats both green and blue by more than `red_threshold`.
+    Otherwise it is black when all of its components are at or below `black_threshold`.
+    Everything else is white. Thresholds are expected to be in the 0-255 range.
+    The whole frame is classified with band operations instead of a per-pixel loop.
+    Returns a (black, red) tuple of '1' mode images, where 0 means ink.
+    """
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    red, green, blue = image.split()
+
+    # subtract() clips at 0, which is fine because only differences above the threshold matter
+    red_over_green = _mask(ImageChops.subtract(red, green), lambda value: value > red_threshold)
+    red_over_blue = _mask(ImageChops.subtract(red, blue), lambda value: value > red_threshold)
+    red_mask = ImageChops.darker(red_over_green, red_over_blue)
+
+    def is_dark(value):
+        return value <= black_threshold
+
+    black_mask = ImageChops.darker(_mask(red, is_dark), _mask(green, is_dark))
+    black_mask = ImageChops.darker(black_mask, _mask(blue, is_dark))
+    # Red takes precedence over black
+    black_mask = ImageChops.subtract(black_mask, red_mask)
+
+    logging.debug("separate_channels() - {}x{}".format(image.width, image.height))
+
+    return _to_plane(black_mask), _to_plane(red_mask)
+
+
+def _to_plane(mask):
+    """
+    Convert an 'L' `mask` (255 = ink) into a '1' mode plane (0 = ink)
+    """
+    return mask.point(lambda value: 0 if value else 255, '1')
+
+
+def get_fingerprint(*planes):
+    """
+    Return a hex digest of the pixel content of the given `planes`.
+    Two frames with the same fingerprint will look the same on screen.
+    """
+    digest = hashlib.sha256()
+    for plane in planes:
+        digest.update("{}:{}x{};".format(plane.mode, plane.width, plane.height).encode('utf-8'))
+        digest.update(plane.tobytes())
+    return digest.hexdigest()
+
+
+def get_changed_regions(previous, current, merge_gap=16):
+    """
+    Compare two '1' mode planes of the same size and return the boxes that differ,
+    as a list of (left, upper, right, lower) tuples, top to bottom.
+    Runs of changed rows closer than `merge_gap` rows are merged into one box.
+    """
+    difference = ImageChops.logical_xor(previous, current)
+    bounds = difference.getbbox()
+    if not bounds:
+        return []
+
+    left, upper, right, lower = bounds
+    bands = []
+    band_start = band_end = None
+    for y in range(upper, lower):
+        if not difference.crop((left, y, right, y + 1)).getbbox():
+            continue
+        if band_start is not None and y - band_end <= merge_gap:
+            band_end = y + 1
+        else:
+            if band_start is not None:
+                bands.append((band_start, band_end))
+            band_start, band_end = y, y + 1
+    bands.append((band_start, band_end))
+
+    regions = []
+    for band_start, band_end in bands:
+        band_left, _, band_right, _ = difference.crop((left, band_start, right, band_end)).getbbox()
+        regions.append((left + band_left, band_start, left + band_right, band_end))
+
+    logging.debug("get_changed_regions() - {}".format(regions))
+    return regions
+
+
+def align_region(region, width, alignment=8):
+    """
+    Widen a (left, upper, right, lower) `region` so that its horizontal edges fall on
+    byte boundaries, which is what the panels' partial window commands need.
+    """
+    left, upper, right, lower = region
+    left = left - left % alignment
+    right = min(width, right + (-right % alignment))
+    return left, upper, right, lower
+
+
+def crop_buffer(buffer, width, region):
+    """
+    Cut the bytes for a byte-aligned `region` out of a full screen 1-bit panel `buffer`
+    """
+    left, upper, right, lower = region
+    row_bytes = width // 8
+    cropped = bytearray()
+    for y in range(upper, lower):
+        row_start = y * row_bytes
+        cropped += buffer[row_start + left // 8:row_start + right // 8]
+    return cropped
@@ -0,0 +1,109 @@
+"""
+A store of screens rendered ahead of time, for screens whose content can be worked out in advance, such as the
+literature clock. Frames are kept already converted to the panel's 1-bit planes, as PNGs of pure black, red and white,
+so displaying one skips the rendering and gives exactly the planes that were stored.
+
+Each frame is recorded with a key of whatever it was rendered from, and is only used while that key still matches.
+"""
+import os
+import json
+import hashlib
+import logging
+from PIL import Image, ImageChops
+from epd_display import get_planes
+
+FRAME_STORE_DIR = "cache_frames"
+
+# Palette indexes of the stored frames
+WHITE, BLACK, RED = 0, 1, 2
+PALETTE = [255, 255, 255, 0, 0, 0, 255, 0, 0]
+
+
+def get_key(*parts):
+    """
+    A short hash of anything JSON can represent
+    """
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def get_waveshare_version():
+    return os.getenv("WAVESHARE_EPD75_VERSION", "2B")
+
+
+def to_panel_image(image, waveshare_epd75_version=None):
+    """
+    Reduce an RGB `image` to the planes the panel will display, as a palette image of pure white, black and red.
+    Displaying it gives exactly the same planes again.
+    """
+    planes = get_planes(image, waveshare_epd75_version or get_waveshare_version())
+    frame = Image.new('P', planes[0].size, WHITE)
+    frame.putpalette(PALETTE)
+    for plane, colour in zip(planes, (BLACK, RED)):
+        # Planes are 0 for ink, and red is pasted last so it takes precedence like separate_channels
+        frame.paste(colour, mask=ImageChops.invert(plane.convert('L')))
+    return frame
+
+
+def write_frame(filename, image, waveshare_epd75_version=None):
+    """
+    Convert `image` with to_panel_image and save it, replacing any frame already there in one go
+    """
+    temporary_filename = filename + ".tmp"
+    to_panel_image(image, waveshare_epd75_version).save(temporary_filename, format="PNG", optimize=True)
+    os.replace(temporary_filename, filename)
+
+
+class FrameStore:
+    """
+    Frames for one screen, in a directory of their own for each set of render `settings` and panel version.
+    The manifest records the key of each frame, and any `meta` values the screen wants to keep about the whole set.
+    """
+
+    def __init__(self, name, settings, cache_dir=FRAME_STORE_DIR, waveshare_epd75_version=None):
+        self.waveshare_epd75_version = waveshare_epd75_version or get_waveshare_version()
+        self.directory = os.path.join(cache_dir, "{}-{}".format(name, get_key(settings, self.waveshare_epd75_version)))
+        self.manifest_filename = os.path.join(self.directory, "manifest.json")
+        os.makedirs(self.directory, exist_ok=True)
+
+        try:
+            with open(self.manifest_filename, 'r', encoding='utf-8') as manifest_file:
+                manifest = json.load(manifest_file)
+            self.frames, self.meta = manifest["frames"], manifest["meta"]
+        except (IOError, ValueError, KeyError):
+            self.frames, self.meta = {}, {}
+
+    def get_filename(self, frame_name):
+        return os.path.join(self.directory, "{}.png".format(frame_name))
+
+    def has(self, frame_name, key):
+        return self.frames.get(frame_name) == key and os.path.isfile(self.get_filename(frame_name))
+
+    def find(self, frame_name, key):
+        """
+        Return the filename of a frame rendered from `key`, or None if there isn't one
+        """
+        if self.has(frame_name, key):
+            logging.debug("FrameStore.find() - {} found".format(self.get_filename(frame_name)))
+            return self.get_filename(frame_name)
+        return None
+
+    def add(self, frame_name, key, image):
+        write_frame(self.get_filename(frame_name), image, self.waveshare_epd75_version)
+        self.record(frame_name, key)
+
+    def record(self, frame_name, key):
+        """
+        Note a frame written with write_frame(), for example by another process
+        """
+        self.frames[frame_name] = key
+
+    def remove(self, frame_name):
+        self.frames.pop(frame_name, None)
+        if os.path.isfile(self.get_filename(frame_name)):
+            os.remove(self.get_filename(frame_name))
+
+    def save(self):
+        temporary_filename = self.manifest_filename + ".tmp"
+        with open(temporary_filename, 'w', encoding='utf-8') as manifest_file:
+            json.dump({"frames": self.frames, "meta": self.meta}, manifest_file)
+        os.replace(temporary_filename, self.manifest_filename)
@@ -0,0 +1,264 @@
+"""
+A cache of provider responses, kept by request: the URL and the headers that change the response.
+Each response body is a file of its own in cache_http/, and index.json records for each one when it was fetched,
+how long it's good for, its size and its ETag and Last-Modified validators.
+
+When the cache holds more than HTTP_CACHE_ENTRIES responses or HTTP_CACHE_SIZE_MB megabytes,
+the least recently used responses are removed.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from email.utils import parsedate_to_datetime
+
+HTTP_CACHE_DIR = "cache_http"
+
+# These headers don't change the response, so they don't make a different entry
+IGNORED_HEADERS = {"user-agent"}
+
+
+def get_cache_key(url, headers=None):
+    """
+    A hash of the URL and the headers that change the response
+    """
+    relevant = sorted((name.lower(), str(value)) for name, value in (headers or {}).items()
+                      if name.lower() not in IGNORED_HEADERS)
+    return hashlib.sha256(json.dumps([url, relevant]).encode('utf-8')).hexdigest()[:32]
+
+
+def _parse_date(value):
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def get_cache_control(headers):
+    """
+    The Cache-Control directives of a response, as a dict of name to value ("" for those without one)
+    """
+    cache_control = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        if name:
+            cache_control[name.lower()] = value.strip('"')
+    return cache_control
+
+
+def is_storable(headers):
+    """
+    Whether the server allows a response to be cached at all
+    """
+    return "no-store" not in get_cache_control(headers)
+
+
+def get_freshness(headers, now=None):
+    """
+    How many more seconds a response is good for, from its Cache-Control, Expires and Age headers.
+    None if the server doesn't say.
+    """
+    now = now or time.time()
+    cache_control = get_cache_control(headers)
+
+    if "no-store" in cache_control or "no-cache" in cache_control:
+        return 0
+
+    try:
+        age = max(0, int(headers.get("Age", 0)))
+    except ValueError:
+        age = 0
+
+    if "max-age" in cache_control:
+        try:
+            return max(0, int(cache_control["max-age"]) - age)
+        except ValueError:
+            # An invalid max-age means the response is already stale
+            return 0
+
+    if "Expires" in headers:
+        expires = _parse_date(headers["Expires"])
+        if expires is None:
+            # An invalid Expires, such as 0, means the response is already stale
+            return 0
+        date = _parse_date(headers.get("Date", "")) or now
+        return max(0, expires - date - age)
+
+    return None
+
+
+def get_ttl(headers, ttl, min_ttl=None, max_ttl=None):
+    """
+    How long to cache a response for: as long as the server says, kept between `min_ttl` and `max_ttl`,
+    or `ttl` if the server doesn't say.
+    no-cache is treated like max-age=0, so it's checked with the server again after `min_ttl`.
+    """
+    freshness = get_freshness(headers)
+    if freshness is None:
+        return ttl
+    if min_ttl is not None:
+        freshness = max(freshness, min_ttl)
+    if max_ttl is not None:
+        freshness = min(freshness, max_ttl)
+    return freshness
+
+
+class HttpCache:
+    """
+    Response bodies on disk and an index of them. Providers are fetched in threads, so the index is used under a lock.
+    """
+
+    def __init__(self, cache_dir=HTTP_CACHE_DIR, max_entries=None, max_bytes=None):
+        self.directory = cache_dir
+        self.index_filename = os.path.join(cache_dir, "index.json")
+        self.max_entries = max_entries or int(os.getenv("HTTP_CACHE_ENTRIES", 64))
+        self.max_bytes = max_bytes or int(float(os.getenv("HTTP_CACHE_SIZE_MB", 10)) * 1024 * 1024)
+        self.lock = threading.RLock()
+        # Whether a response has been read since the index was last saved
+        self.used_since_save = False
+        os.makedirs(self.directory, exist_ok=True)
+
+        try:
+            with open(self.index_filename, 'r', encoding='utf-8') as index_file:
+                self.entries = json.load(index_file)
+        except (IOError, ValueError):
+            self.entries = {}
+        # Drop entries whose body has gone
+        self.entries = {key: entry for key, entry in self.entries.items() if os.path.isfile(self.get_filename(key))}
+
+    def get_filename(self, key):
+        return os.path.join(self.directory, "{}.body".format(key))
+
+    def get_entry(self, key):
+        """
+        The index entry for `key`, or None if it isn't cached
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            return dict(entry) if entry else None
+
+    def is_fresh(self, entry, now=None, max_stale=0):
+        """
+        Whether `entry` is still within its TTL, or no more than `max_stale` seconds past it
+        """
+        return (now or time.time()) - entry["fetched"] <= entry["ttl"] + max_stale
+
+    def read(self, key):
+        """
+        Return the body for `key` as text, or None if it has gone, and note that it was used.
+        A hit doesn't write the index, it's saved with the next store or by save_if_used().
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            try:
+                with open(self.get_filename(key), 'r', encoding='utf-8') as body_file:
+                    body = body_file.read()
+            except FileNotFoundError:
+                self.entries.pop(key, None)
+                return None
+            entry["used"] = time.time()
+            self.used_since_save = True
+        return body
+
+    def store(self, key, url, body, ttl, etag=None, last_modified=None):
+        """
+        Save `body` as the response for `key`, good for `ttl` seconds
+        """
+        with self.lock:
+            filename = self.get_filename(key)
+            temporary_filename = filename + ".tmp"
+            with open(temporary_filename, 'w', encoding='utf-8') as body_file:
+                body_file.write(body)
+            os.replace(temporary_filename, filename)
+
+            now = time.time()
+            self.entries[key] = {
+                "url": url,
+                "fetched": now,
+                "used": now,
+                "ttl": ttl,
+                "size": os.path.getsize(filename),
+                "etag": etag,
+                "last_modified": last_modified,
+            }
+            self.evict()
+            self.save()
+
+    def renew(self, key, ttl, etag=None, last_modified=None):
+        """
+        The server says the response for `key` hasn't changed: it's good for another `ttl` seconds from now
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return
+            entry["fetched"] = time.time()
+            entry["ttl"] = ttl
+            # A 304 may carry newer validators, otherwise the old ones still apply
+            entry["etag"] = etag or entry["etag"]
+            entry["last_modified"] = last_modified or entry["last_modified"]
+            self.save()
+
+    def remove(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            if os.path.isfile(self.get_filename(key)):
+                os.remove(self.get_filename(key))
+
+    def evict(self):
+        """
+        Remove the least recently used responses until the cache is within its limits
+        """
+        with self.lock:
+            by_use = sorted(self.entries, key=lambda key: self.entries[key]["used"])
+            total_bytes = sum(entry["size"] for entry in self.entries.values())
+            while by_use and (len(self.entries) > self.max_entries or total_bytes > self.max_bytes):
+                key = by_use.pop(0)
+                total_bytes -= self.entries[key]["size"]
+                logging.debug("HttpCache.evict() - {}".format(self.entries[key]["url"]))
+                self.remove(key)
+
+    def save(self):
+        with self.lock:
+            temporary_filename = self.index_filename + ".tmp"
+            with open(temporary_filename, 'w', encoding='utf-8') as index_file:
+                json.dump(self.entries, index_file, indent=1)
+            os.replace(temporary_filename, self.index_filename)
+            self.used_since_save = False
+
+    def save_if_used(self):
+        """
+        Save the index if responses have been read since it was last saved, so their use times are kept for eviction
+        """
+        with self.lock:
+            if self.used_since_save:
+                self.save()
+
+
+_http_cache = None
+_http_cache_lock = threading.Lock()
+
+
+def get_http_cache():
+    """
+    The HttpCache shared by every fetch in this process
+    """
+    global _http_cache
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HttpCache()
+        return _http_cache
+
+
+def save_http_cache():
+    """
+    Save when this process last used each cached response, if it used the cache at all
+    """
+    with _http_cache_lock:
+        http_cache = _http_cache
+    if http_cache is not None:
+        http_cache.save_if_used()
@@ -0,0 +1,98 @@
+"""
+One requests session for every download in a process. Connections are pooled and kept alive for each host,
+responses are compressed with gzip or deflate, every request has a connect and read timeout, and requests that
+fail to connect or get a server error are tried again before giving up.
+
+A download that times out reading isn't tried again, but one that gets a server error is, and each try can wait
+HTTP_CONNECT_TIMEOUT to connect and HTTP_READ_TIMEOUT for the response: about 40 seconds by default before it gives up.
+That should stay under run.py's FETCH_TIMEOUT, so a provider that's down ends in an error in time for the cached
+response to be used. The read timeout is the longest gap between bytes, not a limit on the whole download,
+so a server that keeps sending slowly is only stopped by FETCH_TIMEOUT.
+"""
+import os
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Server errors that are usually over by the next try
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+BACKOFF_FACTOR = 0.5
+
+# The sources run.py fetches with a timeout of their own, <SOURCE>_FETCH_TIMEOUT
+FETCH_SOURCES = ("weather", "alert", "calendar", "custom")
+
+
+class TimeoutSession(requests.Session):
+    """
+    A session whose requests time out after `timeout`, a (connect, read) pair of seconds, unless they say otherwise
+    """
+
+    def __init__(self, timeout):
+        super().__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+
+def get_give_up_time(retry_count, connect_timeout, read_timeout):
+    """
+    The longest a download waits before giving up on a server that's down or only answers with errors:
+    each try can use its connect and read timeouts, with a growing pause between tries (urllib3 doesn't pause before the first retry).
+    """
+    backoff = sum(BACKOFF_FACTOR * 2 ** (attempt - 1) for attempt in range(2, retry_count + 1))
+    return (retry_count + 1) * (connect_timeout + read_timeout) + backoff
+
+
+def get_shortest_fetch_timeout():
+    default = os.getenv("FETCH_TIMEOUT", "60")
+    return min(float(os.getenv("{}_FETCH_TIMEOUT".format(source.upper()), default)) for source in FETCH_SOURCES)
+
+
+def create_session():
+    retry_count = int(os.getenv("HTTP_RETRIES", 1))
+    connect_timeout = float(os.getenv("HTTP_CONNECT_TIMEOUT", 5))
+    read_timeout = float(os.getenv("HTTP_READ_TIMEOUT", 15))
+
+    give_up_time = get_give_up_time(retry_count, connect_timeout, read_timeout)
+    fetch_timeout = get_shortest_fetch_timeout()
+    if give_up_time >= fetch_timeout:
+        logging.warning("A download can wait {:.0f}s for a provider that's down, longer than the {:.0f}s fetch timeout. Lower HTTP_RETRIES, "
+                        "HTTP_CONNECT_TIMEOUT or HTTP_READ_TIMEOUT, or a provider that's down will stop the update.".format(give_up_time, fetch_timeout))
+
+    retries = Retry(
+        total=retry_count,
+        # A server that stopped answering once is likely to again, and waiting for it twice would outlast FETCH_TIMEOUT
+        read=0,
+        backoff_factor=BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        # A long Retry-After would hold up the whole update, the cached response is used instead
+        respect_retry_after_header=False,
+        raise_on_status=False)
+    # The weather, alerts and calendar are fetched at the same time, so allow a few connections to each host
+    adapter = HTTPAdapter(pool_connections=8, pool_maxsize=4, max_retries=retries)
+
+    session = TimeoutSession((connect_timeout, read_timeout))
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers["Accept-Encoding"] = "gzip, deflate"
+    return session
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """
+    The session shared by every download in this process
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
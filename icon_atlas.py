@@ -0,0 +1,257 @@
+"""
+Builds an atlas of the weather icons, already rasterized and split into black and red, at every size the
+screen templates draw them. The display code can then paste the icon onto the screen image instead of
+rendering it from vectors every time.
+
+Run this after installing, or after changing the icons or the templates:
+    python3 icon_atlas.py
+"""
+import os
+import re
+import glob
+import json
+import math
+import logging
+import xml.etree.ElementTree as ET
+from collections import namedtuple
+from PIL import Image, ImageChops, PngImagePlugin
+from utility import configure_logging
+from svg_raster import get_screen_size
+from frame_buffer import separate_channels
+from icon_library import ICONS_DIR, get_icons_signature, load_icon_index
+
+ATLAS_FILENAME = "cache_icon_atlas.png"
+
+# The icons are around 100 units across, leave plenty of room around them
+ICON_EXTENT = 200
+PADDING = 16
+
+ATLAS_WIDTH = 2048
+
+# Pixel values in the atlas
+WHITE, BLACK, RED = 255, 0, 128
+
+# Where a template draws its icon, in screen pixels
+IconPlacement = namedtuple("IconPlacement", ["scale", "x", "y"])
+
+# A glyph ready to paste onto the screen image: its black and red masks, and where they go
+IconOverlay = namedtuple("IconOverlay", ["black_mask", "red_mask", "x", "y"])
+
+_transform_regex = re.compile(r'(scale|translate)\s*\(([^)]*)\)')
+
+
+def parse_transform(transform):
+    """
+    Return a transform made of scale() and translate() as (scale, x, y), where a point p goes to scale * p + (x, y).
+    Returns None for anything else, such as rotations or a different scale on each axis.
+    """
+    scale, x, y = 1.0, 0.0, 0.0
+    remainder = _transform_regex.sub('', transform).strip(' ,')
+    if remainder:
+        return None
+
+    for function, arguments in _transform_regex.findall(transform):
+        values = [float(value) for value in re.split(r'[\s,]+', arguments.strip())]
+        if function == "scale":
+            if len(values) > 1 and values[1] != values[0]:
+                return None
+            scale *= values[0]
+        else:
+            x += scale * values[0]
+            y += scale * (values[1] if len(values) > 1 else 0)
+    return scale, x, y
+
+
+def get_icon_placement(template_svg_filename, width=None, height=None):
+    """
+    Find the element holding the ICON_SVG placeholder in a template, and work out where it ends up on a screen of `width` x `height`.
+    Returns None if the template has no such placeholder, or places it in a way the atlas can't reproduce.
+    """
+    if not width or not height:
+        width, height = get_screen_size()
+
+    root = ET.parse(template_svg_filename).getroot()
+    screen_scale = width / float(root.get("width", width))
+    if abs(height / float(root.get("height", height)) - screen_scale) > 0.001:
+        return None
+
+    def find(element, transform):
+        element_transform = parse_transform(element.get("transform", ""))
+        if element_transform is None:
+            return None
+        scale = transform[0] * element_transform[0]
+        transform = (scale,
+                     transform[1] + transform[0] * element_transform[1],
+                     transform[2] + transform[0] * element_transform[2])
+        if element.text and element.text.strip() == "ICON_SVG":
+            return transform
+        for child in element:
+            found = find(child, transform)
+            if found:
+                return found
+        return None
+
+    found = find(root, (screen_scale, 0.0, 0.0))
+    return IconPlacement(*found) if found else None
+
+
+def get_glyph_key(icon_name, placement):
+    """
+    Glyphs depend on the scale and on where they fall within a pixel, but not on the whole pixel position
+    """
+    return "{}@{:.4f}:{:.2f}:{:.2f}".format(icon_name, placement.scale,
+                                            placement.x - math.floor(placement.x), placement.y - math.floor(placement.y))
+
+
+def render_glyph(content, placement):
+    """
+    Rasterize an icon's SVG `content` as the template would, and split it into black and red.
+    Returns the glyph as an 'L' image of WHITE, BLACK and RED pixels, cropped to the ink,
+    and its offset in pixels from the whole pixel position of the placement.
+    """
+    from svg_raster import rasterize_svg
+
+    size = int(math.ceil(ICON_EXTENT * placement.scale)) + 2 * PADDING
+    offset_x = PADDING + placement.x - math.floor(placement.x)
+    offset_y = PADDING + placement.y - math.floor(placement.y)
+    svg = ('<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}">'
+           '<g transform="translate({x} {y}) scale({scale})">{content}</g></svg>').format(
+        size=size, x=offset_x, y=offset_y, scale=placement.scale, content=content)
+
+    image = rasterize_svg(bytestring=svg.encode('utf-8'), width=size, height=size)
+    black, red = separate_channels(image)
+    black_ink = ImageChops.invert(black.convert('L'))
+    red_ink = ImageChops.invert(red.convert('L'))
+
+    bbox = ImageChops.lighter(black_ink, red_ink).getbbox()
+    if not bbox:
+        return Image.new('L', (0, 0), WHITE), 0, 0
+    if bbox[0] == 0 or bbox[1] == 0 or bbox[2] == size or bbox[3] == size:
+        logging.warning("render_glyph() - icon reaches the edge of the {}px canvas and may be cut off".format(size))
+
+    glyph = Image.new('L', (bbox[2] - bbox[0], bbox[3] - bbox[1]), WHITE)
+    glyph.paste(BLACK, mask=black_ink.crop(bbox))
+    glyph.paste(RED, mask=red_ink.crop(bbox))
+    return glyph, bbox[0] - PADDING, bbox[1] - PADDING
+
+
+def build_atlas(template_svg_filenames=None, icons_dir=ICONS_DIR, width=None, height=None, atlas_filename=ATLAS_FILENAME):
+    """
+    Render every icon at every placement used by the templates, and pack them into one atlas image.
+    The index of glyphs is stored in the PNG itself.
+    """
+    if not width or not height:
+        width, height = get_screen_size()
+    if template_svg_filenames is None:
+        template_svg_filenames = sorted(glob.glob("screen-template.*.svg"))
+
+    placements = set()
+    for template_svg_filename in template_svg_filenames:
+        placement = get_icon_placement(template_svg_filename, width, height)
+        if placement:
+            placements.add(placement)
+        else:
+            logging.info("{} has no icon the atlas can draw".format(template_svg_filename))
+
+    glyphs = {}
+    for icon_name, icon in load_icon_index(icons_dir).items():
+        for placement in placements:
+            key = get_glyph_key(icon_name, placement)
+            if key not in glyphs:
+                glyphs[key] = render_glyph(icon["content"], placement)
+
+    # Shelf packing, tallest first
+    index = {}
+    x, y, shelf_height = 0, 0, 0
+    for key in sorted(glyphs, key=lambda key: glyphs[key][0].height, reverse=True):
+        glyph, offset_x, offset_y = glyphs[key]
+        if x + glyph.width > ATLAS_WIDTH:
+            x, y, shelf_height = 0, y + shelf_height, 0
+        index[key] = [x, y, glyph.width, glyph.height, offset_x, offset_y]
+        x += glyph.width
+        shelf_height = max(shelf_height, glyph.height)
+
+    atlas = Image.new('L', (ATLAS_WIDTH, max(1, y + shelf_height)), WHITE)
+    for key, (x, y, _, _, _, _) in index.items():
+        atlas.paste(glyphs[key][0], (x, y))
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("icon_atlas", json.dumps({
+        "icons": get_icons_signature(icons_dir),
+        "screen": [width, height],
+        "glyphs": index,
+    }))
+    atlas.save(atlas_filename, pnginfo=info)
+    logging.info("Wrote {} glyphs for {} placements to {}".format(len(index), len(placements), atlas_filename))
+
+
+def load_atlas(icons_dir=ICONS_DIR, width=None, height=None, atlas_filename=ATLAS_FILENAME):
+    """
+    Return the atlas image and its index, or (None, None) if there's no atlas or it's out of date.
+    """
+    if not width or not height:
+        width, height = get_screen_size()
+    if not os.path.isfile(atlas_filename):
+        return None, None
+
+    try:
+        atlas = Image.open(atlas_filename)
+        index = json.loads(atlas.text["icon_atlas"])
+    except (IOError, ValueError, KeyError) as e:
+        logging.warning("Could not read the icon atlas, run icon_atlas.py to rebuild it. {}".format(e))
+        return None, None
+    if index["screen"] != [width, height] or index["icons"] != get_icons_signature(icons_dir):
+        logging.info("Icon atlas is out of date, run icon_atlas.py to rebuild it")
+        return None, None
+    return atlas, index["glyphs"]
+
+
+def get_icon_overlay(template_svg_filename, icon_name, icons_dir=ICONS_DIR, width=None, height=None,
+                     atlas_filename=ATLAS_FILENAME):
+    """
+    Return the IconOverlay for `icon_name` as drawn by `template_svg_filename`,
+    or None if it has to be rendered from vectors instead.
+    """
+    if not width or not height:
+        width, height = get_screen_size()
+
+    atlas, glyphs = load_atlas(icons_dir, width, height, atlas_filename)
+    if not atlas:
+        return None
+
+    placement = get_icon_placement(template_svg_filename, width, height)
+    if not placement:
+        return None
+
+    key = get_glyph_key(icon_name, placement)
+    if key not in glyphs:
+        logging.info("Icon atlas has no {}, run icon_atlas.py to rebuild it".format(key))
+        return None
+
+    x, y, glyph_width, glyph_height, offset_x, offset_y = glyphs[key]
+    glyph = atlas.crop((x, y, x + glyph_width, y + glyph_height))
+    return IconOverlay(glyph.point(lambda value: 255 if value == BLACK else 0),
+                       glyph.point(lambda value: 255 if value == RED else 0),
+                       math.floor(placement.x) + offset_x,
+                       math.floor(placement.y) + offset_y)
+
+
+def composite_icon(image, overlay):
+    """
+    Paste an IconOverlay onto an RGB screen `image`, in pure black and red so it separates exactly as rendered
+    """
+    if not overlay.black_mask.width or not overlay.black_mask.height:
+        return image
+    image.paste((0, 0, 0), (overlay.x, overlay.y), overlay.black_mask)
+    image.paste((255, 0, 0), (overlay.x, overlay.y), overlay.red_mask)
+    return image
+
+
+def main():
+    configure_logging()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    build_atlas()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import os
+import re
+import json
+import logging
+import xml.etree.ElementTree as ET
+
+ICONS_DIR = "icons"
+SVG_NAMESPACE = "http://www.w3.org/2000/svg"
+
+ET.register_namespace('', SVG_NAMESPACE)
+
+# The index in memory, and the signature of the icons directory it was built from
+_loaded = {}
+
+
+def get_icons_signature(icons_dir=ICONS_DIR):
+    """
+    Something that changes whenever an icon is added, removed or edited, without reading any of them
+    """
+    filenames = sorted(filename for filename in os.listdir(icons_dir) if filename.endswith(".svg"))
+    stats = [os.stat(os.path.join(icons_dir, filename)) for filename in filenames]
+    return [filenames,
+            max([os.stat(icons_dir).st_mtime_ns] + [stat.st_mtime_ns for stat in stats]),
+            sum(stat.st_size for stat in stats)]
+
+
+def compile_icon(svg):
+    """
+    Return the icon's content, which is everything inside its root <svg> element minus comments,
+    and its first <g> element, which create-weather-screen.py scales on its own.
+    """
+    root = ET.fromstring(svg)
+    group = next(root.iter('{{{}}}g'.format(SVG_NAMESPACE)), None)
+
+    content = svg[svg.index('>', svg.index('<svg')) + 1:svg.rindex('</svg>')]
+    content = re.sub(r'<!--.*?-->', '', content, flags=re.DOTALL).strip()
+
+    return {
+        "content": content,
+        "group": ET.tostring(group, encoding='unicode').strip() if group is not None else "",
+    }
+
+
+def build_icon_index(icons_dir=ICONS_DIR):
+    """
+    Parse every icon in `icons_dir`, returns a dict of icon name -> compiled icon
+    """
+    index = {}
+    for filename in sorted(os.listdir(icons_dir)):
+        if not filename.endswith(".svg"):
+            continue
+        with open(os.path.join(icons_dir, filename), 'r', encoding='utf-8') as icon_file:
+            svg = icon_file.read()
+        try:
+            index[os.path.splitext(filename)[0]] = compile_icon(svg)
+        except (ET.ParseError, ValueError) as e:
+            logging.warning("Skipping icon {}. {}".format(filename, e))
+    return index
+
+
+def load_icon_index(icons_dir=ICONS_DIR, cache_dir="."):
+    """
+    Return the icon index. It's kept in cache_icons.json, and only rebuilt when the icons directory changes.
+    """
+    signature = get_icons_signature(icons_dir)
+    if icons_dir in _loaded and _loaded[icons_dir][0] == signature:
+        return _loaded[icons_dir][1]
+
+    cache_filename = os.path.join(cache_dir, "cache_icons.json")
+    index = None
+    try:
+        with open(cache_filename, 'r', encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+        if cached["signature"] == signature:
+            index = cached["icons"]
+    except (IOError, ValueError, KeyError):
+        pass
+
+    if index is None:
+        logging.debug("load_icon_index() - building index of {}".format(icons_dir))
+        index = build_icon_index(icons_dir)
+        try:
+            with open(cache_filename, 'w', encoding='utf-8') as cache_file:
+                json.dump({"signature": signature, "icons": index}, cache_file)
+        except IOError as e:
+            logging.warning("Could not cache icon index. {}".format(e))
+
+    _loaded[icons_dir] = (signature, index)
+    return index
+
+
+def get_icon(icon_name, icons_dir=ICONS_DIR, cache_dir="."):
+    icon = load_icon_index(icons_dir, cache_dir).get(icon_name)
+    if icon is None:
+        logging.warning("Icon {} not found in {}".format(icon_name, icons_dir))
+    return icon
+
+
+def get_icon_svg(icon_name, icons_dir=ICONS_DIR, cache_dir="."):
+    """
+    Return the SVG content of an icon, to go inline in the screen SVG. Empty if there's no such icon.
+    """
+    icon = get_icon(icon_name, icons_dir, cache_dir)
+    return icon["content"] if icon else ""
+
+
+def get_icon_group(icon_name, icons_dir=ICONS_DIR, cache_dir="."):
+    """
+    Return the first <g> element of an icon. Empty if there's no such icon, or it has no group.
+    """
+    icon = get_icon(icon_name, icons_dir, cache_dir)
+    return icon["group"] if icon else ""
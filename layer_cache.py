@@ -0,0 +1,257 @@
+"""
+Most of a screen template never changes: frames, icons, labels and separators. This splits a template into a
+static layer, which is rasterized once and cached, and the dynamic parts that hold placeholders, such as the
+time or a calendar entry. Each dynamic part is rasterized on its own and cached by its filled in content,
+so a cycle only renders the parts whose values changed and pastes everything onto the static layer.
+"""
+import os
+import re
+import json
+import locale
+import hashlib
+import logging
+import xml.dom.minidom
+from PIL import Image, PngImagePlugin
+from svg_raster import get_screen_size
+from svg_template import SLOT_PATTERN, compile_template, fill_template
+
+LAYER_CACHE_DIR = "cache_layers"
+
+# How many rendered layers to keep for each template. The least recently used are removed beyond that.
+LAYER_CACHE_FILES = int(os.getenv("LAYER_CACHE_FILES", 500))
+
+# Kept in every layer, since the rest of the drawing may refer to them
+SHARED_ELEMENTS = {"defs", "style"}
+
+_slot_regex = re.compile(SLOT_PATTERN)
+
+
+def get_dynamic_slots(template_text, output_dict):
+    """
+    The placeholders that will be filled in: those with a value, plus anything that looks like one (LIKE_THIS),
+    so the split doesn't change when, for example, there are fewer calendar events.
+    """
+    tokens = set(compile_template(template_text)[1::2])
+    return {token for token in tokens if "_" in token or token in output_dict}
+
+
+def _has_slot(value, slots):
+    return any(token in slots for token in _slot_regex.findall(value))
+
+
+def _get_path(node):
+    """
+    Child indices from the document element down to `node`, to find the same node in a copy of the document
+    """
+    path = []
+    while node.parentNode.nodeType != node.DOCUMENT_NODE:
+        path.insert(0, node.parentNode.childNodes.index(node))
+        node = node.parentNode
+    return path
+
+
+def _resolve_path(document, path):
+    node = document.documentElement
+    for index in path:
+        node = node.childNodes[index]
+    return node
+
+
+def find_dynamic_units(root, slots):
+    """
+    Return the nodes that have to be rendered again when a placeholder changes, in document order.
+    That's any element with a placeholder in its attributes, the whole <text> element around a placeholder in text,
+    or the placeholder's own text node when it's outside any <text>, such as MONTH_CAL which is filled with SVG elements.
+    """
+    units = []
+
+    def visit(element, text_element):
+        if element.localName == "text" and text_element is None:
+            text_element = element
+
+        if any(_has_slot(attribute.value, slots) for attribute in element.attributes.values()):
+            units.append(text_element or element)
+            return True
+
+        for child in element.childNodes:
+            if child.nodeType == child.TEXT_NODE and _has_slot(child.data, slots):
+                if text_element is not None:
+                    units.append(text_element)
+                    return True
+                units.append(child)
+            elif child.nodeType == child.ELEMENT_NODE:
+                # Everything else in this <text> belongs to the same unit
+                if visit(child, text_element) and text_element is not None:
+                    return True
+        return False
+
+    visit(root, None)
+    return units
+
+
+def split_template(template_text, slots):
+    """
+    Split a template into the static layer, with every dynamic unit removed,
+    and one SVG per dynamic unit, holding just that unit and the elements around it.
+    Returns (static SVG, list of unit SVGs), with the placeholders still in them.
+    """
+    document = xml.dom.minidom.parseString(template_text.encode('utf-8'))
+    paths = [_get_path(unit) for unit in find_dynamic_units(document.documentElement, slots)]
+
+    static_document = document.cloneNode(True)
+    # Last first, so removing a unit doesn't move the ones before it
+    for path in reversed(paths):
+        unit = _resolve_path(static_document, path)
+        unit.parentNode.removeChild(unit)
+
+    unit_svgs = []
+    for path in paths:
+        unit_document = document.cloneNode(True)
+        node = _resolve_path(unit_document, path)
+        while node.parentNode.nodeType != node.DOCUMENT_NODE:
+            for sibling in list(node.parentNode.childNodes):
+                if sibling is not node and sibling.localName not in SHARED_ELEMENTS:
+                    node.parentNode.removeChild(sibling)
+            node = node.parentNode
+        unit_svgs.append(unit_document.toxml())
+
+    return static_document.toxml(), unit_svgs
+
+
+def _get_template_name(template_svg_filename):
+    return os.path.splitext(os.path.basename(template_svg_filename))[0]
+
+
+def load_layers(template_svg_filename, output_dict, cache_dir=LAYER_CACHE_DIR):
+    """
+    Return the compiled static layer and dynamic units of a template, and the dynamic slots they were split on.
+    The split is cached, and done again when the template or its placeholders change.
+    """
+    stat = os.stat(template_svg_filename)
+    with open(template_svg_filename, 'r', encoding='utf-8') as template_file:
+        template_text = template_file.read()
+    slots = sorted(get_dynamic_slots(template_text, output_dict))
+    cache_filename = os.path.join(cache_dir, "{}.json".format(_get_template_name(template_svg_filename)))
+
+    try:
+        with open(cache_filename, 'r', encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+        if (cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size
+                and cached["slots"] == slots and cached["pattern"] == SLOT_PATTERN):
+            return cached["static"], cached["units"], slots
+    except (IOError, ValueError, KeyError):
+        pass
+
+    logging.debug("load_layers() - splitting {}".format(template_svg_filename))
+    static_svg, unit_svgs = split_template(template_text, set(slots))
+    static_segments = compile_template(static_svg)
+    unit_segments = [compile_template(unit_svg) for unit_svg in unit_svgs]
+
+    with open(cache_filename, 'w', encoding='utf-8') as cache_file:
+        json.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "slots": slots, "pattern": SLOT_PATTERN,
+                   "static": static_segments, "units": unit_segments}, cache_file)
+    return static_segments, unit_segments, slots
+
+
+def _get_key(*parts):
+    return hashlib.sha256(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def render_static_layer(template_svg_filename, static_segments, slots, width, height, cache_dir=LAYER_CACHE_DIR):
+    """
+    Return the static layer as an RGB image, rasterizing it only when the template, screen size or locale changes
+    """
+    from svg_raster import rasterize_svg
+
+    stat = os.stat(template_svg_filename)
+    key = _get_key(stat.st_mtime_ns, stat.st_size, width, height, locale.getlocale(), slots)
+    layer_filename = os.path.join(cache_dir, "{}-static-{}.png".format(_get_template_name(template_svg_filename), key))
+
+    if os.path.isfile(layer_filename):
+        os.utime(layer_filename)
+        return Image.open(layer_filename).convert('RGB'), layer_filename
+
+    logging.info("Rendering the static layer of {}".format(template_svg_filename))
+    image = rasterize_svg(os.path.abspath(template_svg_filename),
+                          bytestring=fill_template(static_segments, {}).encode('utf-8'), width=width, height=height)
+    image.save(layer_filename)
+    return image, layer_filename
+
+
+def render_unit(template_svg_filename, unit_svg, width, height, cache_dir=LAYER_CACHE_DIR):
+    """
+    Return a filled in dynamic unit as an RGBA image cropped to what it draws, where it goes, and its cache file.
+    Cached by its content, so a unit is only rasterized when its values change.
+    """
+    from svg_raster import rasterize_svg
+
+    key = _get_key(unit_svg, width, height)
+    unit_filename = os.path.join(cache_dir, "{}-unit-{}.png".format(_get_template_name(template_svg_filename), key))
+
+    if os.path.isfile(unit_filename):
+        logging.debug("render_unit() - {} found in cache".format(unit_filename))
+        # The modification time marks when it was last used, for prune_layers()
+        os.utime(unit_filename)
+        image = Image.open(unit_filename)
+        x, y = json.loads(image.text["offset"])
+        return image.convert('RGBA'), x, y, unit_filename
+
+    image = rasterize_svg(os.path.abspath(template_svg_filename),
+                          bytestring=unit_svg.encode('utf-8'), width=width, height=height, mode='RGBA')
+    bbox = image.getchannel('A').getbbox() or (0, 0, 1, 1)
+    image = image.crop(bbox)
+
+    info = PngImagePlugin.PngInfo()
+    info.add_text("offset", json.dumps(bbox[:2]))
+    image.save(unit_filename, pnginfo=info)
+    return image, bbox[0], bbox[1], unit_filename
+
+
+def prune_layers(template_svg_filename, keep_filenames, cache_dir=LAYER_CACHE_DIR, max_files=LAYER_CACHE_FILES):
+    """
+    Remove the least recently used layers of a template beyond `max_files`, never those in `keep_filenames`.
+    Layers are kept by use rather than dropped as soon as a render doesn't need them,
+    so renders for different minutes, such as the look-ahead frames, don't throw away each other's layers.
+    """
+    prefix = _get_template_name(template_svg_filename) + "-"
+    layers = []
+    for filename in os.listdir(cache_dir):
+        path = os.path.join(cache_dir, filename)
+        if filename.startswith(prefix) and filename.endswith(".png") and path not in keep_filenames:
+            try:
+                layers.append((os.path.getmtime(path), path))
+            except OSError:
+                continue
+
+    layers.sort(reverse=True)
+    for _, path in layers[max(0, max_files - len(keep_filenames)):]:
+        try:
+            os.remove(path)
+        except OSError:
+            # Already removed by another render
+            pass
+
+
+def render_layered(template_svg_filename, output_dict, width=None, height=None, cache_dir=LAYER_CACHE_DIR):
+    """
+    Render a template filled in with `output_dict` to an RGB image, from the cached static layer
+    and dynamic units. Only units whose values changed since they were last rendered are rasterized.
+    """
+    if not width or not height:
+        width, height = get_screen_size()
+    os.makedirs(cache_dir, exist_ok=True)
+
+    static_segments, unit_segments, slots = load_layers(template_svg_filename, output_dict, cache_dir)
+    image, static_filename = render_static_layer(template_svg_filename, static_segments, slots, width, height, cache_dir)
+    used_filenames = {static_filename}
+
+    for segments in unit_segments:
+        unit_svg = fill_template(segments, output_dict)
+        unit, x, y, unit_filename = render_unit(template_svg_filename, unit_svg, width, height, cache_dir)
+        used_filenames.add(unit_filename)
+        image.paste(unit.convert('RGB'), (x, y), unit.getchannel('A'))
+
+    prune_layers(template_svg_filename, used_filenames, cache_dir)
+
+    logging.debug("render_layered() - {} dynamic units".format(len(unit_segments)))
+    return image
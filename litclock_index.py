@@ -0,0 +1,166 @@
+"""
+Compiles litclock_annotated.csv into a binary index by minute of the day, so the literature clock can find
+the current minute's quote without reading the whole CSV every minute.
+
+The index file holds a header with the size and modification time of the CSV it was built from, then a table
+of 1440 minutes, then a table of quotes, then the quote rows themselves. It's memory mapped, and rebuilt
+whenever the CSV changes.
+"""
+import os
+import mmap
+import struct
+import logging
+
+CSV_FILENAME = "litclock_annotated.csv"
+INDEX_FILENAME = "cache_litclock.bin"
+
+FIELDNAMES = ["time", "time_human", "full_quote", "book_title", "author_name", "sfw"]
+
+MINUTES_PER_DAY = 1440
+
+# magic, version, CSV mtime_ns, CSV size, number of quotes
+HEADER = struct.Struct("<4sHqqI")
+MAGIC = b"LITC"
+VERSION = 1
+
+# first quote, number of quotes, shortest quote, shortest safe for work quote
+MINUTE = struct.Struct("<IHHH")
+
+# offset and length of the row, length of the quote
+QUOTE = struct.Struct("<III")
+
+NO_QUOTE = 0xFFFF
+
+# The CSV marks quotes that are not safe for work as "nsfw", everything else is shown in SFW mode
+NSFW_VALUE = "nsfw"
+
+
+def get_minute_of_day(time_text):
+    """
+    Return the minute of the day for "HH:MM", or None if it isn't a time
+    """
+    try:
+        hours, minutes = time_text.split(":")
+        minute = int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+    return minute if 0 <= minute < MINUTES_PER_DAY else None
+
+
+def _parse_row(row):
+    return dict(zip(FIELDNAMES, row.decode('utf-8').split("|")))
+
+
+def build_quote_index(csv_filename=CSV_FILENAME, index_filename=INDEX_FILENAME):
+    """
+    Compile the CSV into the index file, replacing it in one go so a reader never sees half of it
+    """
+    stat = os.stat(csv_filename)
+    with open(csv_filename, 'rb') as csv_file:
+        rows = [line.rstrip(b"\r") for line in csv_file.read().split(b"\n")]
+
+    # Quotes for each minute in the order they appear in the CSV: (row, quote length, safe for work)
+    minutes = [[] for _ in range(MINUTES_PER_DAY)]
+    for row in rows:
+        fields = _parse_row(row)
+        minute = get_minute_of_day(fields.get("time", ""))
+        if minute is None or "full_quote" not in fields:
+            continue
+        minutes[minute].append((row, len(fields["full_quote"]), fields.get("sfw", "").strip() != NSFW_VALUE))
+
+    minute_table, quote_table, blob = [], [], bytearray()
+    for quotes in minutes:
+        shortest = shortest_sfw = NO_QUOTE
+        for number, (row, length, sfw) in enumerate(quotes):
+            if shortest == NO_QUOTE or length < quotes[shortest][1]:
+                shortest = number
+            if sfw and (shortest_sfw == NO_QUOTE or length < quotes[shortest_sfw][1]):
+                shortest_sfw = number
+        minute_table.append(MINUTE.pack(len(quote_table), len(quotes), shortest, shortest_sfw))
+        for row, length, _ in quotes:
+            quote_table.append(QUOTE.pack(len(blob), len(row), length))
+            blob += row
+
+    temporary_filename = index_filename + ".tmp"
+    with open(temporary_filename, 'wb') as index_file:
+        index_file.write(HEADER.pack(MAGIC, VERSION, stat.st_mtime_ns, stat.st_size, len(quote_table)))
+        index_file.write(b"".join(minute_table))
+        index_file.write(b"".join(quote_table))
+        index_file.write(blob)
+    os.replace(temporary_filename, index_filename)
+    logging.info("Indexed {} quotes from {} into {}".format(len(quote_table), csv_filename, index_filename))
+
+
+class QuoteIndex:
+    """
+    A memory mapped quote index. Looking up a minute reads just that minute's entries.
+    """
+
+    def __init__(self, index_filename):
+        with open(index_filename, 'rb') as index_file:
+            self.data = mmap.mmap(index_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.mtime_ns, self.size, quote_count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.data.close()
+            raise ValueError("{} is not a version {} quote index".format(index_filename, VERSION))
+        self.quotes_offset = HEADER.size + MINUTES_PER_DAY * MINUTE.size
+        self.blob_offset = self.quotes_offset + quote_count * QUOTE.size
+
+    def matches(self, stat):
+        return self.mtime_ns == stat.st_mtime_ns and self.size == stat.st_size
+
+    def _get_quote(self, number):
+        offset, length, _ = QUOTE.unpack_from(self.data, self.quotes_offset + number * QUOTE.size)
+        start = self.blob_offset + offset
+        return _parse_row(self.data[start:start + length])
+
+    def get_quotes(self, minute):
+        """
+        All the quotes for a minute of the day, as dicts of FIELDNAMES
+        """
+        first, count, _, _ = MINUTE.unpack_from(self.data, HEADER.size + minute * MINUTE.size)
+        return [self._get_quote(first + number) for number in range(count)]
+
+    def get_shortest_quote(self, minute, sfw=False):
+        """
+        The shortest quote for a minute of the day, only from those safe for work if `sfw` is set.
+        None if there isn't one.
+        """
+        first, _, shortest, shortest_sfw = MINUTE.unpack_from(self.data, HEADER.size + minute * MINUTE.size)
+        number = shortest_sfw if sfw else shortest
+        return self._get_quote(first + number) if number != NO_QUOTE else None
+
+    def close(self):
+        self.data.close()
+
+
+# Indexes already mapped, by filename
+_loaded = {}
+
+
+def load_quote_index(csv_filename=CSV_FILENAME, index_filename=INDEX_FILENAME):
+    """
+    Return the QuoteIndex for the CSV, building it first if there isn't one or the CSV has changed since
+    """
+    stat = os.stat(csv_filename)
+    index = _loaded.get(index_filename)
+    if index and index.matches(stat):
+        return index
+    if index:
+        index.close()
+
+    try:
+        index = QuoteIndex(index_filename)
+        if not index.matches(stat):
+            index.close()
+            index = None
+    except (IOError, ValueError, struct.error) as e:
+        logging.debug("load_quote_index() - {}".format(e))
+        index = None
+
+    if index is None:
+        build_quote_index(csv_filename, index_filename)
+        index = QuoteIndex(index_filename)
+
+    _loaded[index_filename] = index
+    return index
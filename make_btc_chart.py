@@ -1,5 +1,5 @@
 import logging
-import requests
+from http_session import get_session
 import pandas as pd
 import mplfinance as mpf
 
@@ -9,7 +9,7 @@ def fetch_binance_data(symbol="BTCUSDT", interval="15m", limit=48):
     """
     url = f"https://api.binance.com/api/v3/klines?symbol={symbol}&interval={interval}&limit={limit}"
     try:
-        response = requests.get(url)
+        response = get_session().get(url)
         data = response.json()
         # Check for errors in the response
         if isinstance(data, dict) and data.get("code"):
@@ -0,0 +1,206 @@
+"""
+Measurements of one update cycle: how long each stage took and the memory it used, how often the caches were used,
+how much was downloaded from each host and how long it took, and how the screen was refreshed.
+
+run.py starts and finishes a cycle. At the end it appends the cycle to a JSONL trace if METRICS_TRACE is set,
+and writes a Prometheus textfile collector file if METRICS_TEXTFILE is set.
+"""
+import os
+import json
+import time
+import logging
+import resource
+import threading
+from urllib.parse import urlparse
+
+CACHE_OUTCOMES = ("hit", "miss", "stale", "revalidated", "served_stale")
+
+# Sources are fetched in threads, so everything is recorded under this lock
+_lock = threading.Lock()
+_cycle = {}
+# The process's peak memory use when the current stage started, and whether the kernel's peak was reset for it
+_stage_start = {}
+
+
+def start_cycle():
+    global _cycle
+    with _lock:
+        _cycle = {
+            "start": time.time(),
+            "start_perf": time.perf_counter(),
+            "stages": [],
+            "caches": {},
+            "http": {},
+            "refresh": None,
+            "time_to_glass": None,
+        }
+
+
+def get_max_rss():
+    """
+    The most memory the process has used so far, in bytes
+    """
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def reset_peak_rss():
+    """
+    Start measuring the peak memory use of the process afresh, on Linux. Returns False where that isn't possible.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def get_peak_rss():
+    """
+    The most memory the process has used since reset_peak_rss(), in bytes, or None if it can't be read
+    """
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def start_stage():
+    """
+    Note the memory use at the start of a stage, for record_stage()
+    """
+    with _lock:
+        _stage_start["max_rss"] = get_max_rss()
+        _stage_start["peak_reset"] = reset_peak_rss()
+
+
+def record_stage(name, seconds, error=False):
+    """
+    Note how long a stage took and how much memory it used: its peak memory use where the kernel can measure that,
+    and how much it raised the peak memory use of the process since it started
+    """
+    with _lock:
+        peak_rss = get_peak_rss() if _stage_start.get("peak_reset") else None
+        max_rss_growth = max(0, get_max_rss() - _stage_start["max_rss"]) if "max_rss" in _stage_start else None
+        _stage_start.clear()
+        _cycle.setdefault("stages", []).append(
+            {"name": name, "seconds": round(seconds, 6), "peak_rss": peak_rss, "max_rss_growth": max_rss_growth, "error": error})
+
+
+def count_cache(cache_name, outcome):
+    """
+    Count a lookup in a cache as a "hit", a "miss" (nothing cached yet), "stale" (cached too long ago)
+    "revalidated" (cached too long ago, but the server said it hasn't changed)
+    or "served_stale" (cached too long ago, but used anyway while the source is fetched again or can't be reached)
+    """
+    with _lock:
+        counts = _cycle.setdefault("caches", {}).setdefault(os.path.basename(cache_name), dict.fromkeys(CACHE_OUTCOMES, 0))
+        counts[outcome] += 1
+
+
+def record_http(url, body_bytes, seconds, status=None):
+    """
+    Note a download from `url`. Downloads are added up by host, which stands in for the provider.
+    """
+    host = urlparse(url).netloc or url
+    with _lock:
+        http = _cycle.setdefault("http", {}).setdefault(host, {"requests": 0, "bytes": 0, "seconds": 0.0, "errors": 0})
+        http["requests"] += 1
+        http["bytes"] += body_bytes
+        http["seconds"] = round(http["seconds"] + seconds, 6)
+        if status is None or status >= 400:
+            http["errors"] += 1
+
+
+def record_refresh(refresh):
+    """
+    Note how the screen was refreshed, and the time from the start of the cycle until it was
+    """
+    with _lock:
+        _cycle["refresh"] = refresh
+        if "start_perf" in _cycle:
+            _cycle["time_to_glass"] = round(time.perf_counter() - _cycle["start_perf"], 6)
+
+
+def get_cycle():
+    with _lock:
+        cycle = {key: value for key, value in _cycle.items() if key != "start_perf"}
+        if "start_perf" in _cycle:
+            cycle["seconds"] = round(time.perf_counter() - _cycle["start_perf"], 6)
+        return json.loads(json.dumps(cycle))
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_prometheus(cycle, success):
+    """
+    The cycle as Prometheus text exposition format
+    """
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append("# HELP epaper_{} {}".format(name, help_text))
+        lines.append("# TYPE epaper_{} gauge".format(name))
+        for labels, value in samples:
+            label_text = ",".join('{}="{}"'.format(key, _escape_label(label)) for key, label in labels.items())
+            lines.append("epaper_{}{} {}".format(name, "{" + label_text + "}" if label_text else "", value))
+
+    metric("last_cycle_timestamp_seconds", "When the last update cycle started.", [({}, cycle.get("start", 0))])
+    metric("last_cycle_success", "Whether the last update cycle finished without an error.", [({}, int(success))])
+    metric("cycle_seconds", "How long the last update cycle took.", [({}, cycle.get("seconds", 0))])
+    metric("stage_seconds", "How long each stage of the last cycle took.",
+           [({"stage": stage["name"]}, stage["seconds"]) for stage in cycle.get("stages", [])])
+    metric("stage_peak_rss_bytes", "Peak memory use during each stage of the last cycle.",
+           [({"stage": stage["name"]}, stage["peak_rss"]) for stage in cycle.get("stages", []) if stage.get("peak_rss") is not None])
+    metric("stage_max_rss_growth_bytes", "How much each stage of the last cycle raised the process's peak memory use.",
+           [({"stage": stage["name"]}, stage["max_rss_growth"])
+            for stage in cycle.get("stages", []) if stage.get("max_rss_growth") is not None])
+    metric("cache_lookups", "Cache lookups in the last cycle, by outcome.",
+           [({"cache": cache, "outcome": outcome}, count)
+            for cache, counts in sorted(cycle.get("caches", {}).items()) for outcome, count in counts.items()])
+    metric("http_requests", "HTTP requests in the last cycle, by host.",
+           [({"host": host}, http["requests"]) for host, http in sorted(cycle.get("http", {}).items())])
+    metric("http_errors", "Failed HTTP requests in the last cycle, by host.",
+           [({"host": host}, http["errors"]) for host, http in sorted(cycle.get("http", {}).items())])
+    metric("http_bytes", "Bytes downloaded in the last cycle, by host.",
+           [({"host": host}, http["bytes"]) for host, http in sorted(cycle.get("http", {}).items())])
+    metric("http_seconds", "Time spent downloading in the last cycle, by host.",
+           [({"host": host}, http["seconds"]) for host, http in sorted(cycle.get("http", {}).items())])
+    metric("refresh", "How the screen was refreshed in the last cycle.",
+           [({"kind": kind}, int(cycle.get("refresh") == kind)) for kind in ("full", "partial", "skipped", "daemon")])
+    if cycle.get("time_to_glass") is not None:
+        metric("time_to_glass_seconds", "Time from the start of the last cycle until the screen was updated.",
+               [({}, cycle["time_to_glass"])])
+    return "\n".join(lines) + "\n"
+
+
+def finish_cycle(success=True):
+    """
+    Write out the cycle to METRICS_TRACE and METRICS_TEXTFILE, whichever are set
+    """
+    cycle = get_cycle()
+    cycle["success"] = success
+
+    trace_filename = os.getenv("METRICS_TRACE")
+    textfile_filename = os.getenv("METRICS_TEXTFILE")
+    try:
+        if trace_filename:
+            with open(trace_filename, "a", encoding="utf-8") as trace_file:
+                trace_file.write(json.dumps(cycle) + "\n")
+
+        if textfile_filename:
+            # The collector may read it at any time, so replace it in one go
+            temporary_filename = textfile_filename + ".tmp"
+            with open(temporary_filename, "w", encoding="utf-8") as textfile:
+                textfile.write(format_prometheus(cycle, success))
+            os.replace(temporary_filename, textfile_filename)
+    except IOError as e:
+        logging.warning("Could not write metrics. {}".format(e))
+    return cycle
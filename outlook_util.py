@@ -1,8 +1,8 @@
 import logging
 import datetime
-import requests
 from calendar_providers.outlook import OutlookCalendar
 from utility import configure_logging
+from http_session import get_session
 
 
 configure_logging()
@@ -18,7 +18,7 @@ def main():
 
         headers = {'Authorization': 'Bearer ' + access_token}
 
-        calendars_data = requests.get(endpoint_calendar_list, headers=headers).json()
+        calendars_data = get_session().get(endpoint_calendar_list, headers=headers).json()
 
         print("")
         print("Here are the available Calendar names and IDs.  Copy the ID of the Calendar you want into env.sh")
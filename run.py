@@ -0,0 +1,422 @@
+"""
+Runs a whole update cycle in a single Python process: gather the data, fill in the SVG, render it and display it.
+This does the same as the separate scripts did when run.sh called them one after the other,
+but the libraries are only imported once, and the time taken by each stage is logged.
+"""
+import os
+import re
+import sys
+import time
+import fcntl
+import logging
+import datetime
+import importlib
+import threading
+import metrics
+from collections import namedtuple
+from xml.parsers.expat import ExpatError
+from utility import configure_logging, configure_locale, wait_for_refreshes
+from svg_raster import get_screen_size
+from svg_template import load_template, get_slots, fill_template, render_template, CUSTOM_SVG_LINK
+from icon_atlas import get_icon_overlay, composite_icon
+from layer_cache import render_layered
+from frame_store import FrameStore, get_key
+from http_cache import save_http_cache
+
+configure_locale()
+configure_logging()
+
+
+# A filled in screen, ready to render: the template, its values, and any icons to paste on once it's rasterized
+ScreenFrame = namedtuple("ScreenFrame", ["template_svg_filename", "output_dict", "overlays"])
+
+
+class StageError(Exception):
+    pass
+
+
+class Cycle:
+    """
+    Runs stages and keeps track of how long each one took
+    """
+
+    def __init__(self):
+        self.timings = []
+
+    def run_stage(self, name, function, *args):
+        """
+        Run `function` as the stage called `name`, and return its result.
+        A stage that raises, or calls sys.exit with an error, stops the cycle.
+        """
+        logging.info("---------------------------------------")
+        logging.info(name.upper())
+        logging.info("---------------------------------------")
+        metrics.start_stage()
+        start = time.perf_counter()
+        error = True
+        try:
+            result = function(*args)
+            error = False
+            return result
+        except SystemExit as e:
+            if e.code:
+                raise StageError("⚠️Error in stage '{}', stopping.".format(name)) from e
+            error = False
+        except Exception as e:
+            logging.exception(e)
+            raise StageError("⚠️Error in stage '{}', stopping.".format(name)) from e
+        finally:
+            self.timings.append((name, time.perf_counter() - start))
+            metrics.record_stage(name, time.perf_counter() - start, error)
+
+    def log_timings(self):
+        summary = ", ".join("{} {:.3f}s".format(name, seconds) for name, seconds in self.timings)
+        total = sum(seconds for _, seconds in self.timings)
+        logging.info("Stage timings: {} (total {:.3f}s)".format(summary, total))
+
+
+def import_script(name):
+    """
+    Import one of the hyphenated scripts, eg screen-weather-get.py, as a module
+    """
+    return importlib.import_module(name)
+
+
+def run_script(name):
+    """
+    Import a script and run its main()
+    """
+    return import_script(name).main()
+
+
+def get_fetch_timeout(source):
+    """
+    Seconds to wait for a data source, from <SOURCE>_FETCH_TIMEOUT or else FETCH_TIMEOUT
+    """
+    return float(os.getenv("{}_FETCH_TIMEOUT".format(source.upper()), os.getenv("FETCH_TIMEOUT", "60")))
+
+
+def fetch_concurrently(sources):
+    """
+    Call each function in `sources`, a dict of name -> function, in its own thread.
+    Returns a dict of name -> result once they've all finished.
+    A source that raises, calls sys.exit or takes longer than its timeout makes this raise StageError.
+    """
+    results = {}
+    errors = {}
+
+    def fetch(name, function):
+        try:
+            results[name] = function()
+        except BaseException as e:
+            errors[name] = e
+
+    # Daemon threads, so a source that hangs past its timeout doesn't stop the process exiting
+    threads = {}
+    for name, function in sources.items():
+        threads[name] = threading.Thread(target=fetch, args=(name, function), name=name, daemon=True)
+        threads[name].start()
+
+    start = time.perf_counter()
+    for name, thread in threads.items():
+        thread.join(max(0, get_fetch_timeout(name) - (time.perf_counter() - start)))
+        if thread.is_alive():
+            raise StageError("⚠️Timed out fetching {} after {}s, stopping.".format(name, get_fetch_timeout(name)))
+        logging.debug("fetch_concurrently() - {} done after {:.3f}s".format(name, time.perf_counter() - start))
+
+    for name, e in errors.items():
+        if isinstance(e, SystemExit) and not e.code:
+            continue
+        if not isinstance(e, SystemExit):
+            logging.exception(e, exc_info=e)
+        raise StageError("⚠️Error fetching {}, stopping.".format(name)) from e
+
+    return results
+
+
+def gather_data():
+    """
+    Fetch the weather, alerts, calendar and custom data at the same time, so a cycle waits for the slowest source rather than all of them.
+    Returns the placeholder values for the screen template, or None if there's no weather.
+    """
+    # Import in this thread, the scripts configure locale and logging when imported
+    weather_script = import_script("screen-weather-get")
+    calendar_script = import_script("screen-calendar-get")
+
+    sources = {
+        "weather": weather_script.get_weather_output,
+        "alert": weather_script.get_alert_output,
+        "calendar": calendar_script.get_calendar_output,
+    }
+
+    # Only layout 5 shows a calendar, so save a few seconds.
+    if os.getenv("SCREEN_LAYOUT", "1") == "5":
+        sources["month"] = import_script("screen-calendar-month").get_month_output
+
+    if os.path.isfile("screen-custom-get.py"):
+        sources["custom"] = get_custom_svg
+
+    results = fetch_concurrently(sources)
+
+    if not results["weather"]:
+        return None
+
+    output_dict = {**results["weather"], **weather_script.get_time_output(), **results["alert"], **results["calendar"]}
+    if "month" in results:
+        output_dict.update(results["month"])
+    output_dict["CUSTOM_SVG"] = results.get("custom", "")
+    logging.info("gather_data() - {}".format(output_dict))
+    return output_dict
+
+
+def get_custom_svg():
+    """
+    Returns the filled in screen-custom.svg, to go in the CUSTOM_SVG slot of the screen template.
+    Custom scripts from before get_custom_output() existed write screen-output-custom-temp.svg themselves, so link to that instead.
+    """
+    custom_script = import_script("screen-custom-get")
+    if not hasattr(custom_script, "get_custom_output"):
+        custom_script.main()
+        return CUSTOM_SVG_LINK
+
+    custom_svg = render_template("screen-custom.svg", custom_script.get_custom_output())
+    # It's going inside the screen SVG, so it can't have its own XML declaration
+    return re.sub(r'^\s*<\?xml[^>]*\?>', '', custom_svg)
+
+
+def prepare_screen(output_dict):
+    """
+    Work out how to draw the gathered values: which template, and whether the icon comes from the icon atlas.
+    Returns a ScreenFrame.
+    """
+    weather_script = import_script("screen-weather-get")
+    template_svg_filename = weather_script.get_template_svg_filename()
+    segments = load_template(template_svg_filename)
+
+    # Templates from before the CUSTOM_SVG slot link to the custom SVG file instead
+    if "CUSTOM_SVG" not in get_slots(segments) and output_dict["CUSTOM_SVG"] != CUSTOM_SVG_LINK:
+        with open("screen-output-custom-temp.svg", "w") as custom_svg:
+            custom_svg.write(output_dict["CUSTOM_SVG"] or "<svg />\n")
+
+    # Paste the weather icon from the icon atlas rather than rendering it, when there is one
+    overlays = []
+    if "ICON_SVG" in get_slots(segments):
+        icon_overlay = get_icon_overlay(template_svg_filename, output_dict.get("ICON_ONE", ""))
+        if icon_overlay:
+            output_dict = {**output_dict, "ICON_SVG": ""}
+            overlays.append(icon_overlay)
+
+    if os.getenv("SAVE_PREVIEW_PNG", "0") == "1":
+        with open("screen-output-weather.svg", "w", encoding="utf-8") as output_svg_file:
+            output_svg_file.write(fill_template(segments, output_dict))
+    return ScreenFrame(template_svg_filename, output_dict, overlays)
+
+
+def render_frame(frame):
+    """
+    Rasterize a ScreenFrame to an RGB image.
+    Unless LAYER_CACHE=0, only the parts of the template that changed are rendered, on top of the cached static layer.
+    """
+    image = None
+    if os.getenv("LAYER_CACHE", "1") == "1":
+        try:
+            image = render_layered(frame.template_svg_filename, frame.output_dict)
+        except (ExpatError, IOError) as e:
+            logging.warning("Could not use the layer cache, rendering the whole screen. {}".format(e))
+
+    if image is None:
+        from svg_raster import rasterize_svg
+        svg = render_template(frame.template_svg_filename, frame.output_dict)
+        image = rasterize_svg(os.path.abspath(frame.template_svg_filename), bytestring=svg.encode('utf-8'))
+
+    for overlay in frame.overlays:
+        composite_icon(image, overlay)
+    return image
+
+
+def get_lookahead_minutes():
+    return int(os.getenv("LOOKAHEAD_MINUTES", "0"))
+
+
+def get_lookahead_store():
+    return FrameStore("lookahead", list(get_screen_size()))
+
+
+def get_frame_key(frame):
+    """
+    Everything the rendered ScreenFrame depends on, so a pre-rendered frame is only used for exactly the same screen
+    """
+    stat = os.stat(frame.template_svg_filename)
+    return get_key(frame.template_svg_filename, stat.st_mtime_ns, stat.st_size, get_screen_size(), frame.output_dict,
+                   [(overlay.x, overlay.y) for overlay in frame.overlays])
+
+
+def find_prerendered_frame(frame):
+    """
+    Return the filename of `frame` if an earlier cycle rendered it ahead of time, otherwise None
+    """
+    key = get_frame_key(frame)
+    return get_lookahead_store().find(key, key)
+
+
+def get_upcoming_frames(frame, minutes, now=None):
+    """
+    The ScreenFrame for each of the next `minutes` minutes, where only the time and date change
+    """
+    weather_script = import_script("screen-weather-get")
+    now = (now or datetime.datetime.now()).replace(second=0, microsecond=0)
+    return [frame._replace(output_dict={**frame.output_dict,
+                                        **weather_script.get_time_output(now + datetime.timedelta(minutes=minute))})
+            for minute in range(1, minutes + 1)]
+
+
+def prerender_frames(frame, minutes):
+    """
+    Render the next `minutes` minutes of `frame` into the look-ahead frame store, so later cycles can display them
+    straight away. Frames rendered from any other data are removed, so a change in the data is never hidden by an old frame.
+    Only one process does this at a time, and frames that are already there aren't rendered again.
+    """
+    store = get_lookahead_store()
+    with open(os.path.join(store.directory, "lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("Another cycle is already pre-rendering, skipping")
+            return
+
+        # Read the manifest again, now that no other cycle is changing it
+        store = get_lookahead_store()
+        upcoming = {get_frame_key(upcoming_frame): upcoming_frame for upcoming_frame in get_upcoming_frames(frame, minutes)}
+        for key in list(store.frames):
+            if key not in upcoming:
+                store.remove(key)
+        store.save()
+
+        for key, upcoming_frame in upcoming.items():
+            if not store.has(key, key):
+                store.add(key, key, render_frame(upcoming_frame))
+                store.save()
+        logging.info("Pre-rendered the next {} minutes".format(minutes))
+
+
+def start_prerender(frame):
+    """
+    Pre-render the next LOOKAHEAD_MINUTES minutes in a thread, while the screen is refreshing.
+    Returns the thread, or None when look-ahead is off.
+    """
+    if not get_lookahead_minutes():
+        return None
+
+    def prerender():
+        try:
+            prerender_frames(frame, get_lookahead_minutes())
+        except Exception as e:
+            logging.warning("Could not pre-render the next minutes. {}".format(e))
+
+    thread = threading.Thread(target=prerender, name="prerender")
+    thread.start()
+    return thread
+
+
+def get_xkcd_comic():
+    """
+    Returns whether a new comic was downloaded.
+    xkcd_get.py exits with an error when the comic is still fresh, which just means there's nothing new to display.
+    """
+    xkcd_get = import_script("xkcd_get")
+    try:
+        xkcd_get.xkcd_get_img()
+    except SystemExit:
+        return False
+    return True
+
+
+def get_word_clock():
+    return import_script("word_clock").get_word_clock()
+
+
+def display_file(filename, preview_filename=None):
+    from svg_raster import load_screen_image
+    return display_image(load_screen_image(filename), preview_filename)
+
+
+def display_image(image, preview_filename=None):
+    display = import_script("display")
+
+    if preview_filename and os.getenv("SAVE_PREVIEW_PNG", "0") == "1":
+        logging.debug("Write preview file: " + preview_filename)
+        image.save(preview_filename)
+
+    try:
+        refresh = display.display_image(image)
+        metrics.record_refresh(refresh)
+        return refresh
+    except IOError as e:
+        logging.exception(e)
+
+
+def run_cycle(cycle):
+    if os.getenv("PRIVACY_MODE_XKCD") == "1":
+        if cycle.run_stage("Get XKCD comic strip", get_xkcd_comic):
+            cycle.run_stage("Display on screen", display_file, "xkcd-comic-strip.png")
+
+    elif os.getenv("PRIVACY_MODE_LITERATURE_CLOCK") == "1":
+        # The clock's frame may come from its pre-rendered frames rather than screen-literature-clock.png
+        filename = cycle.run_stage("Get Literature Clock", run_script, "screen-literature-clock-get")
+        cycle.run_stage("Display on screen", display_file, filename or "screen-literature-clock.png")
+
+    elif os.getenv("PRIVACY_MODE_WORD_CLOCK") == "1":
+        filename = cycle.run_stage("Get Word Clock", get_word_clock)
+        cycle.run_stage("Display on screen", display_file, filename)
+
+    else:
+        output_dict = cycle.run_stage("Gather weather, calendar and custom data", gather_data)
+
+        # Without weather, the screen is left as it was
+        if output_dict:
+            frame = cycle.run_stage("Fill in SVG", prepare_screen, output_dict)
+
+            prerendered_filename = None
+            if get_lookahead_minutes():
+                prerendered_filename = cycle.run_stage("Find pre-rendered screen", find_prerendered_frame, frame)
+
+            if prerendered_filename:
+                prerender = start_prerender(frame)
+                cycle.run_stage("Display on screen", display_file, prerendered_filename, "screen-output.png")
+            else:
+                image = cycle.run_stage("Render screen", render_frame, frame)
+                prerender = start_prerender(frame)
+                cycle.run_stage("Display on screen", display_image, image, "screen-output.png")
+
+            if prerender:
+                cycle.run_stage("Pre-render the next minutes", prerender.join)
+
+
+def main():
+    # The scripts expect to find their templates and caches in the working directory
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+    width, height = get_screen_size()
+    os.environ.setdefault("WAVESHARE_WIDTH", str(width))
+    os.environ.setdefault("WAVESHARE_HEIGHT", str(height))
+
+    metrics.start_cycle()
+    cycle = Cycle()
+    success = False
+    try:
+        run_cycle(cycle)
+        success = True
+    except StageError as e:
+        logging.error(e)
+        sys.exit(1)
+    finally:
+        # Cached responses used while they're fetched again in the background are only renewed once the fetch finishes
+        wait_for_refreshes(get_fetch_timeout("refresh"))
+        # Responses that were only read this run are otherwise evicted as if they hadn't been used
+        save_http_cache()
+        cycle.log_timings()
+        metrics.finish_cycle(success)
+
+
+if __name__ == "__main__":
+    main()
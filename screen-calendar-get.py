@@ -74,10 +74,10 @@ def get_datetime_formatted(event_start, event_end, is_all_day_event, start_only=
     return day
 
 
-def main():
-
-    output_svg_filename = 'screen-output-weather.svg'
-
+def get_calendar_output():
+    """
+    Fetch the calendar events and return the values for the calendar placeholders in the SVG
+    """
     today_start_time = datetime.datetime.utcnow()
     if os.getenv("CALENDAR_INCLUDE_PAST_EVENTS_FOR_TODAY", "0") == "1":
         today_start_time = datetime.datetime.combine(datetime.datetime.utcnow(), datetime.datetime.min.time())
@@ -109,6 +109,15 @@ def main():
     for key, value in output_dict.items():
         output_dict[key] = emoji.replace_emoji(value,  replace=lambda chars, data_dict: '<tspan style="font-family:emoji">' + chars + '</tspan>')
 
+    return output_dict
+
+
+def main():
+
+    output_svg_filename = 'screen-output-weather.svg'
+
+    output_dict = get_calendar_output()
+
     logging.info("main() - {}".format(output_dict))
 
     logging.info("Updating SVG")
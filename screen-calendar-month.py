@@ -18,7 +18,10 @@ except babel.core.UnknownLocaleError:
     babel_locale = babel.Locale("")
 
 
-def main():
+def get_month_output():
+    """
+    Draw this month's calendar and return it as the value for the MONTH_CAL placeholder in the SVG
+    """
     logging.info("Generating SVG for calendar month")
 
     # Python does not know about the locale's first day of week 🤦  https://stackoverflow.com/a/4265852/974369
@@ -59,8 +62,12 @@ def main():
     # Remove the <?xml> line
     svg_output = svg_output.split('\n', 1)[1]
 
+    return {'MONTH_CAL': svg_output}
+
+
+def main():
     output_svg_filename = 'screen-output-weather.svg'
-    output_dict = {'MONTH_CAL': svg_output}
+    output_dict = get_month_output()
     logging.info("main() - {}".format(output_dict))
     logging.info("Updating SVG")
     update_svg(output_svg_filename, output_svg_filename, output_dict)
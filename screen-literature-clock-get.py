@@ -1,11 +1,18 @@
-import textwrap
 import requests
-import csv
+import os
+import sys
+import fcntl
+import subprocess
+import multiprocessing
 import datetime
 import re
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageDraw
 import logging
 from utility import is_stale, configure_logging
+from http_session import get_session
+from litclock_index import MINUTES_PER_DAY, load_quote_index
+from frame_store import FrameStore, get_key, write_frame
+from text_render import get_font, get_text_length, get_line_height, get_lines_height, wrap_text, fit_font_size
 
 configure_logging()
 
@@ -13,13 +20,21 @@ configure_logging()
 IMAGE_WIDTH = 800
 IMAGE_HEIGHT = 480
 FONT_PATH = "/usr/share/fonts/truetype/NotoSans-Regular.ttf"
-
-def get_quote():
+MIN_FONT_SIZE = 20
+MAX_FONT_SIZE = 60
+MAX_TEXT_WIDTH = IMAGE_WIDTH - 100
+MAX_TEXT_HEIGHT = IMAGE_HEIGHT - 80
+LINE_SPACING = 1.2
+ATTRIBUTION_GAP = 10
+HIGHLIGHT_MARKER = "|"
+OUTPUT_FILENAME = "screen-literature-clock.png"
+
+def get_quote(now=None):
     """Fetch the current time's quote from the CSV file."""
     if is_stale('litclock_annotated.csv', 86400):
         url = "https://raw.githubusercontent.com/JohannesNE/literature-clock/master/litclock_annotated.csv"
         try:
-            response = requests.get(url)
+            response = get_session().get(url)
             response.raise_for_status()
             with open('litclock_annotated.csv', 'w') as text_file:
                 text_file.write(response.text)
@@ -28,18 +43,18 @@ def get_quote():
             logging.error(f"Failed to fetch or save litclock_annotated.csv: {e}")
             return None
 
-    current_time = datetime.datetime.now().strftime("%H:%M")
-    with open('litclock_annotated.csv', 'r') as file:
-        reader = csv.DictReader(file, fieldnames=["time", "time_human", "full_quote", "book_title", "author_name", "sfw"],
-                                delimiter='|', lineterminator='\n', quotechar=None, quoting=csv.QUOTE_NONE)
-        quotes = [row for row in reader if row["time"] == current_time]
+    now = now or datetime.datetime.now()
+    # Choose the shortest quote to fit in the image
+    quote = load_quote_index().get_shortest_quote(now.hour * 60 + now.minute, sfw=is_sfw())
 
-    if not quotes:
+    if not quote:
         logging.error("No quotes found for this time.")
         return None
 
-    # Choose the shortest quote to fit in the image
-    return min(quotes, key=lambda x: len(x["full_quote"]))
+    return quote
+
+def is_sfw():
+    return os.getenv("LITERATURE_CLOCK_SFW") == "1"
 
 def clean_quote(quote, human_time):
     """Clean up quote text and highlight the time."""\
@@ -51,75 +66,149 @@ def clean_quote(quote, human_time):
 
     # Replace the human-readable time in the quote with markers for styling
     time_highlight = re.compile(re.escape(human_time), re.IGNORECASE)
-    quote = time_highlight.sub(lambda x: f"|{x.group()}|", quote, count=1)
+    quote = time_highlight.sub(lambda x: f"{HIGHLIGHT_MARKER}{x.group()}{HIGHLIGHT_MARKER}", quote, count=1)
 
     return quote
 
-def calculate_font_size(quote):
-    """Dynamically calculate font size based on quote length."""
-    length_factor = min(max(len(quote) / 120, 0.5), 1.2)  # Adjust scale factor
-    font_size = max(25, int(50 - (length_factor * 15)))
-    return font_size
+def fit_quote(quote, attribution):
+    """Find the largest font size at which the quote and its attribution fit the screen."""
+    def fits(size):
+        lines = wrap_text(quote, FONT_PATH, size, MAX_TEXT_WIDTH, markup=HIGHLIGHT_MARKER)
+        height = get_lines_height(lines, FONT_PATH, size, LINE_SPACING) + ATTRIBUTION_GAP \
+            + get_line_height(FONT_PATH, size - 5, attribution)
+        return height <= MAX_TEXT_HEIGHT and get_text_length(FONT_PATH, size - 5, attribution) <= MAX_TEXT_WIDTH
+
+    font_size = fit_font_size(fits, MIN_FONT_SIZE, MAX_FONT_SIZE)
+    return font_size, wrap_text(quote, FONT_PATH, font_size, MAX_TEXT_WIDTH, markup=HIGHLIGHT_MARKER)
 
 def create_image(quote, attribution, human_time):
     """Generate an image with the quote displayed dynamically."""
     image = Image.new("RGB", (IMAGE_WIDTH, IMAGE_HEIGHT), "white")
     draw = ImageDraw.Draw(image)
 
-    # Load fonts
-    try:
-        font_size = calculate_font_size(quote)
-        font = ImageFont.truetype(FONT_PATH, font_size)
-        attribution_font = ImageFont.truetype(FONT_PATH, font_size - 5)
-    except OSError:
-        logging.error("Failed to load custom font. Using default font.")
-        font = ImageFont.load_default()
-        attribution_font = ImageFont.load_default()
-
-    # Word wrapping based on image width
-    max_width = IMAGE_WIDTH - 100
-    lines = []
-    for paragraph in quote.split("\n"):
-        lines.extend(textwrap.wrap(paragraph, width=40))  # Adjust for better fit
+    font_size, lines = fit_quote(quote, attribution)
+    font = get_font(FONT_PATH, font_size)
+    attribution_font = get_font(FONT_PATH, font_size - 5)
 
     # Calculate vertical centering
-    total_text_height = sum([font.getbbox(line)[3] for line in lines]) * 1.2
+    total_text_height = get_lines_height(lines, FONT_PATH, font_size, LINE_SPACING)
     y_offset = (IMAGE_HEIGHT - total_text_height) // 2 - 20
 
-    # Render text
+    # Render text, the human time is highlighted in red and may run over more than one line
+    highlighted = False
     for line in lines:
-        x_offset = (IMAGE_WIDTH - draw.textlength(line, font=font)) // 2  # Center text
-        if "|" in line:  # Highlight human time in red
-            parts = line.split("|")
-            draw.text((x_offset, y_offset), parts[0], font=font, fill="black")
-            text_width = draw.textlength(parts[0], font=font)
-            draw.text((x_offset + text_width, y_offset), parts[1], font=font, fill="red")
-            text_width += draw.textlength(parts[1], font=font)
-            draw.text((x_offset + text_width, y_offset), parts[2], font=font, fill="black")
-        else:
-            draw.text((x_offset, y_offset), line, font=font, fill="black")
-        y_offset += font.getbbox(line)[3] * 1.2  # Adjust spacing
+        parts = line.split(HIGHLIGHT_MARKER)
+        x_offset = (IMAGE_WIDTH - get_text_length(FONT_PATH, font_size, "".join(parts))) // 2  # Center text
+        for index, part in enumerate(parts):
+            if index:
+                highlighted = not highlighted
+            draw.text((x_offset, y_offset), part, font=font, fill="red" if highlighted else "black")
+            x_offset += get_text_length(FONT_PATH, font_size, part)
+        y_offset += get_line_height(FONT_PATH, font_size, line) * LINE_SPACING
 
     # Draw attribution
-    attribution_x = (IMAGE_WIDTH - draw.textlength(attribution, font=attribution_font)) // 2
-    draw.text((attribution_x, y_offset + 10), attribution, font=attribution_font, fill="black")
+    attribution_x = (IMAGE_WIDTH - get_text_length(FONT_PATH, font_size - 5, attribution)) // 2
+    draw.text((attribution_x, y_offset + ATTRIBUTION_GAP), attribution, font=attribution_font, fill="black")
 
-    # Save image
-    output_filename = "screen-literature-clock.png"
-    try:
-        image.save(output_filename, optimize=True, compress_level=0)
-        logging.info(f"Image saved as {output_filename}")
-    except Exception as e:
-        logging.error(f"Failed to save image: {e}")
+    return image
+
+def render_quote(chosen_item):
+    """Render the screen for a quote from the CSV."""
+    quote = clean_quote(chosen_item["full_quote"], chosen_item["time_human"])
+    attribution = f"- {chosen_item['book_title']}, {chosen_item['author_name']}"
+    return create_image(quote, attribution, chosen_item["time_human"])
+
+def get_frame_store():
+    """The pre-rendered frames, kept apart for each font and screen size."""
+    font_stat = os.stat(FONT_PATH) if os.path.isfile(FONT_PATH) else None
+    settings = [FONT_PATH, font_stat and [font_stat.st_mtime_ns, font_stat.st_size], IMAGE_WIDTH, IMAGE_HEIGHT,
+                MIN_FONT_SIZE, MAX_FONT_SIZE, MAX_TEXT_WIDTH, MAX_TEXT_HEIGHT, LINE_SPACING, ATTRIBUTION_GAP]
+    return FrameStore("litclock", settings)
+
+def _prerender_minute(job):
+    """Render one minute's frame, in a worker process."""
+    minute, chosen_item, filename, waveshare_epd75_version = job
+    write_frame(filename, render_quote(chosen_item), waveshare_epd75_version)
+    return minute
+
+def get_source():
+    """What the frames are rendered from: the quotes and whether they're safe for work."""
+    index = load_quote_index()
+    return [index.mtime_ns, index.size, is_sfw()]
+
+def prerender_frames(processes=None):
+    """
+    Render every minute of the day into the frame store, across a pool of processes.
+    Only minutes whose quote changed since the last time are rendered, and nothing is done while the CSV stays the same.
+    Only one process does this at a time.
+    """
+    with open(os.path.join(get_frame_store().directory, "lock"), "w") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            logging.info("The literature clock is already being pre-rendered, skipping")
+            return
+        # Read the manifest now that no other process is changing it
+        _prerender_frames(get_frame_store(), processes)
+
+def _prerender_frames(store, processes):
+    index = load_quote_index()
+    source = get_source()
+    if store.meta.get("source") == source:
+        return
+
+    jobs, keys = [], {}
+    for minute in range(MINUTES_PER_DAY):
+        chosen_item = index.get_shortest_quote(minute, sfw=is_sfw())
+        if not chosen_item:
+            store.remove(str(minute))
+            continue
+        keys[minute] = get_key(chosen_item)
+        if not store.has(str(minute), keys[minute]):
+            jobs.append((minute, chosen_item, store.get_filename(str(minute)), store.waveshare_epd75_version))
+
+    logging.info(f"Pre-rendering {len(jobs)} literature clock frames, {len(keys) - len(jobs)} are up to date")
+    if jobs:
+        with multiprocessing.Pool(processes) as pool:
+            for minute in pool.imap_unordered(_prerender_minute, jobs):
+                store.record(str(minute), keys[minute])
+    store.meta["source"] = source
+    store.save()
+
+def start_prerender():
+    """Pre-render the frames in a process of its own, which carries on after this one exits."""
+    logging.info("Pre-rendering the literature clock in the background")
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), "--prerender"], start_new_session=True)
 
 def main():
-    chosen_item = get_quote()
+    now = datetime.datetime.now()
+    chosen_item = get_quote(now)
     if not chosen_item:
         return
 
-    quote = clean_quote(chosen_item["full_quote"], chosen_item["time_human"])
-    attribution = f"- {chosen_item['book_title']}, {chosen_item['author_name']}"
-    create_image(quote, attribution, chosen_item["time_human"])
+    # Use the frame rendered ahead of time for this minute, if there is one.
+    # Otherwise render it now, and have the frames brought up to date in the background for the next runs.
+    if os.getenv("LITERATURE_CLOCK_PRERENDER", "0") == "1":
+        store = get_frame_store()
+        frame_filename = store.find(str(now.hour * 60 + now.minute), get_key(chosen_item))
+        if frame_filename:
+            return frame_filename
+        if store.meta.get("source") != get_source():
+            start_prerender()
+
+    image = render_quote(chosen_item)
+
+    # Save image
+    try:
+        image.save(OUTPUT_FILENAME, optimize=True, compress_level=0)
+        logging.info(f"Image saved as {OUTPUT_FILENAME}")
+    except Exception as e:
+        logging.error(f"Failed to save image: {e}")
+    return OUTPUT_FILENAME
 
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["--prerender"]:
+        if get_quote():
+            prerender_frames()
+    else:
+        main()
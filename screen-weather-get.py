@@ -8,6 +8,8 @@ from weather_providers import climacell, openweathermap, metofficedatahub, metno
 from alert_providers import metofficerssfeed, weathergovalerts
 from alert_providers import meteireann as meteireannalertprovider
 from utility import get_formatted_time, update_svg, configure_logging, configure_locale
+from svg_template import CUSTOM_SVG_LINK
+from icon_library import get_icon_svg
 import textwrap
 import html
 
@@ -133,57 +135,100 @@ def get_alert_message(location_lat, location_long):
     return alert_message
 
 
-def main():
+def get_location():
+    return os.getenv("WEATHER_LATITUDE", "51.5077"), os.getenv("WEATHER_LONGITUDE", "-0.1277")
 
-    template_name = os.getenv("SCREEN_LAYOUT", "1")
-    location_lat = os.getenv("WEATHER_LATITUDE", "51.5077")
-    location_long = os.getenv("WEATHER_LONGITUDE", "-0.1277")
-    weather_format = os.getenv("WEATHER_FORMAT", "CELSIUS")
 
-    if (weather_format == "CELSIUS"):
-        units = "metric"
-        degrees = "°C"
-    else:
-        units = "imperial"
-        degrees = "°F"
+def get_units():
+    """
+    Return the units to ask the weather provider for, and the symbol to display
+    """
+    if (os.getenv("WEATHER_FORMAT", "CELSIUS") == "CELSIUS"):
+        return "metric", "°C"
+    return "imperial", "°F"
+
+
+def get_weather_output():
+    """
+    Fetch the weather and return the values for the weather placeholders in the SVG.
+    Returns None if there is no weather.
+    """
+    location_lat, location_long = get_location()
+    units, degrees = get_units()
 
     weather = get_weather(location_lat, location_long, units)
 
     if not weather:
         logging.error("Unable to fetch weather payload. SVG will not be updated.")
-        return
+        return None
 
     weather_desc = format_weather_description(weather["description"])
 
-    alert_message = get_alert_message(location_lat, location_long)
-    alert_message = format_alert_description(alert_message)
+    return {
+        'LOW_ONE': "{}{}".format(str(round(weather['temperatureMin'])), degrees),
+        'HIGH_ONE': "{}{}".format(str(round(weather['temperatureMax'])), degrees),
+        'ICON_ONE': weather["icon"],
+        'ICON_SVG': get_icon_svg(weather["icon"]),
+        'WEATHER_DESC_1': weather_desc[1],
+        'WEATHER_DESC_2': weather_desc[2],
+    }
+
 
-    time_now = get_formatted_time(datetime.datetime.now())
+def get_time_output(now=None):
+    """
+    Return the values for the time and date placeholders in the SVG, for `now` or else the current time
+    """
+    now = now or datetime.datetime.now()
+    time_now = get_formatted_time(now)
     time_now_font_size = "100px"
 
     if len(time_now) > 6:
         time_now_font_size = str(100 - (len(time_now)-5) * 5) + "px"
 
-    output_dict = {
-        'LOW_ONE': "{}{}".format(str(round(weather['temperatureMin'])), degrees),
-        'HIGH_ONE': "{}{}".format(str(round(weather['temperatureMax'])), degrees),
-        'ICON_ONE': weather["icon"],
-        'WEATHER_DESC_1': weather_desc[1],
-        'WEATHER_DESC_2': weather_desc[2],
+    return {
         'TIME_NOW_FONT_SIZE': time_now_font_size,
         'TIME_NOW': time_now,
-        'HOUR_NOW': datetime.datetime.now().strftime("%-I %p"),
-        'DAY_ONE': datetime.datetime.now().strftime("%b %-d, %Y"),
-        'DAY_NAME': datetime.datetime.now().strftime("%A"),
+        'HOUR_NOW': now.strftime("%-I %p"),
+        'DAY_ONE': now.strftime("%b %-d, %Y"),
+        'DAY_NAME': now.strftime("%A"),
+    }
+
+
+def get_alert_output():
+    """
+    Fetch any severe weather alert and return the values for the alert placeholders in the SVG
+    """
+    location_lat, location_long = get_location()
+    alert_message = get_alert_message(location_lat, location_long)
+    alert_message = format_alert_description(alert_message)
+
+    return {
         'ALERT_MESSAGE_VISIBILITY': "visible" if alert_message else "hidden",
         'ALERT_MESSAGE': alert_message
     }
 
+
+def get_template_svg_filename():
+    template_name = os.getenv("SCREEN_LAYOUT", "1")
+    return f'screen-template.{template_name}.svg'
+
+
+def main():
+
+    weather_output = get_weather_output()
+
+    if not weather_output:
+        return
+
+    output_dict = {**weather_output, **get_time_output(), **get_alert_output()}
+    # When the scripts are run one by one, screen-custom-get.py writes the custom data to its own file
+    output_dict['CUSTOM_SVG'] = CUSTOM_SVG_LINK
+
     logging.info(output_dict)
 
     logging.info("Updating SVG")
 
-    template_svg_filename = f'screen-template.{template_name}.svg'
+    template_svg_filename = get_template_svg_filename()
     output_svg_filename = 'screen-output-weather.svg'
     update_svg(template_svg_filename, output_svg_filename, output_dict)
 
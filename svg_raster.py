@@ -0,0 +1,57 @@
+import os
+import logging
+from PIL import Image
+
+
+def get_screen_size():
+    """
+    Return the (width, height) of the screen, from WAVESHARE_WIDTH/WAVESHARE_HEIGHT,
+    or from the Waveshare version if those aren't set.
+    """
+    if os.getenv("WAVESHARE_EPD75_VERSION", "2B") == "1":
+        default_width, default_height = 640, 384
+    else:
+        default_width, default_height = 800, 480
+    return int(os.getenv("WAVESHARE_WIDTH", default_width)), int(os.getenv("WAVESHARE_HEIGHT", default_height))
+
+
+def rasterize_svg(svg_filename=None, bytestring=None, width=None, height=None, dpi=300, mode='RGB'):
+    """
+    Render an SVG to an RGB PIL image entirely in memory, the same way the
+    `cairosvg -f png --dpi 300 --output-width --output-height` command line does, but without the PNG.
+    Pass the SVG as a `svg_filename`, or as a `bytestring` (relative links are then resolved against `svg_filename`, if given).
+    Use a `mode` of 'RGBA' to keep the transparency.
+    """
+    # cairosvg is slow to import, only pay for it when rendering
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PNGSurface
+
+    if not width or not height:
+        width, height = get_screen_size()
+
+    tree = Tree(bytestring=bytestring, url=svg_filename, unsafe=False)
+    # An output of None renders into the cairo surface without writing anything out
+    surface = PNGSurface(tree, None, dpi, output_width=width, output_height=height)
+    cairo_surface = surface.cairo
+    cairo_surface.flush()
+
+    # Cairo's ARGB32 is premultiplied and native-endian, which is BGRA in memory on the (little-endian) Pi
+    image = Image.frombuffer('RGBA', (cairo_surface.get_width(), cairo_surface.get_height()),
+                             bytes(cairo_surface.get_data()), 'raw', 'BGRa', cairo_surface.get_stride(), 1)
+
+    logging.debug("rasterize_svg() - {}x{} from {}".format(image.width, image.height, svg_filename or "bytes"))
+    return image.convert(mode)
+
+
+def load_screen_image(filename):
+    """
+    Return the RGB image for `filename`. SVGs are rasterized in memory, anything else is opened with PIL.
+    """
+    if filename.lower().endswith(".svg"):
+        return rasterize_svg(filename)
+
+    image = Image.open(filename)
+    # Ensure the image is in RGB mode
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return image
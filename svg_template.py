@@ -0,0 +1,76 @@
+import os
+import re
+import json
+import codecs
+import logging
+
+# Placeholders are whole upper case words, such as TIME_NOW, CAL_DESC_10 or MONTH_CAL
+SLOT_PATTERN = r'\b([A-Z][A-Z0-9]*(?:_[A-Z0-9]+)*)\b'
+
+_slot_regex = re.compile(SLOT_PATTERN)
+
+# What the screen templates had in place of the CUSTOM_SVG slot, for when the custom data is in its own file
+CUSTOM_SVG_LINK = '<use href="screen-output-custom-temp.svg" />'
+
+
+def compile_template(text):
+    """
+    Split an SVG template into segments, alternating between literal chunks and slot names:
+    [literal, slot, literal, slot, ..., literal]
+    """
+    return _slot_regex.split(text)
+
+
+def get_cache_filename(template_svg_filename, cache_dir="."):
+    name = os.path.splitext(os.path.basename(template_svg_filename))[0]
+    return os.path.join(cache_dir, "cache_template_{}.json".format(name))
+
+
+def load_template(template_svg_filename, cache_dir="."):
+    """
+    Return the compiled segments for `template_svg_filename`.
+    They're cached on disk, and compiled again when the template's modified time or size changes.
+    """
+    stat = os.stat(template_svg_filename)
+    cache_filename = get_cache_filename(template_svg_filename, cache_dir)
+
+    try:
+        with open(cache_filename, 'r', encoding='utf-8') as cache_file:
+            cached = json.load(cache_file)
+        if (cached["mtime_ns"] == stat.st_mtime_ns and cached["size"] == stat.st_size
+                and cached["pattern"] == SLOT_PATTERN):
+            logging.debug("load_template() - {} found in cache".format(template_svg_filename))
+            return cached["segments"]
+    except (IOError, ValueError, KeyError):
+        pass
+
+    logging.debug("load_template() - compiling {}".format(template_svg_filename))
+    segments = compile_template(codecs.open(template_svg_filename, 'r', encoding='utf-8').read())
+    try:
+        with open(cache_filename, 'w', encoding='utf-8') as cache_file:
+            json.dump({"mtime_ns": stat.st_mtime_ns, "size": stat.st_size,
+                       "pattern": SLOT_PATTERN, "segments": segments}, cache_file)
+    except IOError as e:
+        logging.warning("Could not cache compiled template {}. {}".format(template_svg_filename, e))
+    return segments
+
+
+def get_slots(segments):
+    return set(segments[1::2])
+
+
+def fill_template(segments, output_dict):
+    """
+    Build the SVG from compiled `segments`, with each slot replaced by its value in `output_dict`.
+    Slots without a value are left as they were.
+    """
+    parts = list(segments)
+    parts[1::2] = [output_dict.get(slot, slot) for slot in segments[1::2]]
+    return "".join(parts)
+
+
+def render_template(template_svg_filename, output_dict, cache_dir="."):
+    """
+    Fill in `template_svg_filename` with the values in `output_dict` and return the SVG as a string
+    """
+    return fill_template(load_template(template_svg_filename, cache_dir), output_dict)
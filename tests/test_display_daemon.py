@@ -0,0 +1,81 @@
+"""
+Runs frames through the display daemon's LatestFrame and draw_frames with the fake driver, no screen needed.
+"""
+import time
+import importlib
+import threading
+from PIL import Image
+from epd_display import EPDDisplay
+from epd_drivers.fake import FakeDriver
+
+display_daemon = importlib.import_module("display-daemon")
+
+
+def make_frame(colour):
+    return Image.new("RGB", (800, 480), colour)
+
+
+def start_drawing(driver, latest_frame, tmp_path):
+    epd_display = EPDDisplay("2", driver=driver, state_dir=str(tmp_path))
+    # draw_frames runs until the process exits, the daemon thread goes away with the test run
+    threading.Thread(target=display_daemon.draw_frames, args=(epd_display, latest_frame), daemon=True).start()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def get_call_names(driver):
+    return [name for name, _ in driver.calls]
+
+
+def test_latest_frame_keeps_only_the_newest():
+    latest_frame = display_daemon.LatestFrame()
+    old, new = make_frame("white"), make_frame("black")
+    latest_frame.put(old)
+    latest_frame.put(new)
+
+    assert latest_frame.has_frame()
+    assert latest_frame.take(timeout=0) is new
+    assert not latest_frame.has_frame()
+    assert latest_frame.take(timeout=0) is None
+
+
+def test_draw_frames_displays_and_sleeps(tmp_path):
+    driver = FakeDriver("2")
+    latest_frame = display_daemon.LatestFrame()
+    latest_frame.put(make_frame("black"))
+    start_drawing(driver, latest_frame, tmp_path)
+
+    wait_for(lambda: get_call_names(driver).count("sleep") == 1)
+    assert get_call_names(driver) == ["init", "display", "sleep"]
+
+    latest_frame.put(make_frame("white"))
+    wait_for(lambda: get_call_names(driver).count("sleep") == 2)
+    assert get_call_names(driver).count("display") == 2
+
+
+class FailingDriver(FakeDriver):
+    """
+    Fails to display the first frame, like a panel that didn't answer
+    """
+
+    def display(self, *buffers):
+        if "failed" not in [name for name, _ in self.calls]:
+            self.record("failed")
+            raise RuntimeError("The panel didn't answer")
+        super().display(*buffers)
+
+
+def test_draw_frames_carries_on_after_a_driver_error(tmp_path):
+    driver = FailingDriver("2")
+    latest_frame = display_daemon.LatestFrame()
+    latest_frame.put(make_frame("black"))
+    start_drawing(driver, latest_frame, tmp_path)
+
+    wait_for(lambda: "failed" in get_call_names(driver) and not latest_frame.has_frame())
+    latest_frame.put(make_frame("white"))
+    wait_for(lambda: "display" in get_call_names(driver))
@@ -0,0 +1,191 @@
+"""
+The HTTP cache's freshness rules, and get_json_from_url on top of it with the downloads stubbed out.
+"""
+import json
+import time
+import pytest
+import requests
+from email.utils import formatdate
+from requests.structures import CaseInsensitiveDict
+import utility
+from http_cache import HttpCache, get_cache_key, get_freshness, get_ttl
+
+URL = "https://example.com/forecast"
+NOW = 1800000000
+
+
+def test_max_age_less_age():
+    assert get_freshness({"Cache-Control": "public, max-age=1800", "Age": "300"}) == 1500
+    assert get_freshness({"Cache-Control": "max-age=100", "Age": "300"}) == 0
+
+
+def test_expires_less_date():
+    headers = {"Expires": formatdate(NOW + 600, usegmt=True), "Date": formatdate(NOW, usegmt=True)}
+    assert get_freshness(headers) == 600
+    assert get_freshness({**headers, "Age": "100"}) == 500
+
+
+def test_max_age_wins_over_expires():
+    headers = {"Cache-Control": "max-age=60", "Expires": formatdate(NOW + 600, usegmt=True), "Date": formatdate(NOW, usegmt=True)}
+    assert get_freshness(headers) == 60
+
+
+def test_invalid_values_are_stale():
+    assert get_freshness({"Expires": "0"}) == 0
+    assert get_freshness({"Cache-Control": "max-age=soon"}) == 0
+
+
+def test_no_freshness_headers():
+    assert get_freshness({}) is None
+    assert get_ttl({}, 3600, 300, 21600) == 3600
+
+
+def test_floor_and_ceiling():
+    assert get_ttl({"Cache-Control": "max-age=60"}, 3600, 300, 21600) == 300
+    assert get_ttl({"Cache-Control": "max-age=1800"}, 3600, 300, 21600) == 1800
+    assert get_ttl({"Cache-Control": "max-age=99999"}, 3600, 300, 21600) == 21600
+
+
+def test_no_cache_gets_the_floor_like_max_age_0():
+    assert get_ttl({"Cache-Control": "no-cache"}, 3600, 300, 21600) == 300
+    assert get_ttl({"Cache-Control": "max-age=0"}, 3600, 300, 21600) == 300
+
+
+class FakeResponse:
+
+    def __init__(self, status_code=200, body="", headers=None):
+        self.status_code = status_code
+        self.text = body
+        self.content = body.encode('utf-8')
+        self.headers = CaseInsensitiveDict(headers or {})
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError("{} Error".format(self.status_code), response=self)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Stands in for the provider: each download gets the next response in `server.responses`,
+    and the request headers are kept in `server.requests`
+    """
+    cache = HttpCache(str(tmp_path / "cache_http"))
+    monkeypatch.setattr(utility, "get_http_cache", lambda: cache)
+    monkeypatch.delenv("HTTP_STALE_WHILE_REVALIDATE", raising=False)
+    monkeypatch.delenv("HTTP_MAX_STALE", raising=False)
+
+    class Server:
+        responses = []
+        requests = []
+
+    def http_get(url, headers=None):
+        Server.requests.append(dict(headers or {}))
+        response = Server.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    monkeypatch.setattr(utility, "http_get", http_get)
+    Server.cache = cache
+    return Server
+
+
+def get_entry(cache):
+    return cache.get_entry(get_cache_key(URL, {}))
+
+
+def age_entry(cache, seconds):
+    """
+    Make the cached response look like it was fetched `seconds` ago
+    """
+    cache.entries[get_cache_key(URL, {})]["fetched"] = time.time() - seconds
+
+
+def test_fetches_then_hits(server):
+    server.responses = [FakeResponse(body='{"v": 1}', headers={"Cache-Control": "max-age=1800"})]
+    assert utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600) == {"v": 1}
+    assert utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600) == {"v": 1}
+    assert len(server.requests) == 1
+    assert get_entry(server.cache)["ttl"] == 1800
+
+
+def test_304_with_freshness_headers_takes_the_new_lifetime(server):
+    server.responses = [
+        FakeResponse(body='{"v": 1}', headers={"Cache-Control": "max-age=100", "ETag": '"a"'}),
+        FakeResponse(304, headers={"Cache-Control": "max-age=1200"}),
+    ]
+    utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600)
+    age_entry(server.cache, 400)
+
+    assert utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600) == {"v": 1}
+    assert server.requests[1]["If-None-Match"] == '"a"'
+    assert get_entry(server.cache)["ttl"] == 1200
+
+
+def test_304_without_freshness_headers_keeps_the_lifetime(server):
+    server.responses = [
+        FakeResponse(body='{"v": 1}', headers={"Cache-Control": "max-age=100", "Last-Modified": "Tue, 01 Jan 2030 00:00:00 GMT"}),
+        FakeResponse(304),
+    ]
+    utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600)
+    assert get_entry(server.cache)["ttl"] == 300
+    age_entry(server.cache, 400)
+
+    assert utility.get_json_from_url(URL, {}, "weather", 3600, 300, 21600) == {"v": 1}
+    assert server.requests[1]["If-Modified-Since"] == "Tue, 01 Jan 2030 00:00:00 GMT"
+    # Not WEATHER_TTL's 3600
+    assert get_entry(server.cache)["ttl"] == 300
+    assert server.cache.is_fresh(get_entry(server.cache))
+
+
+def test_no_store_drops_the_entry(server):
+    server.responses = [
+        FakeResponse(body='{"v": 1}'),
+        FakeResponse(body='{"v": 2}', headers={"Cache-Control": "no-store"}),
+    ]
+    utility.get_json_from_url(URL, {}, "weather", 0)
+    assert get_entry(server.cache)
+
+    assert utility.get_json_from_url(URL, {}, "weather", 0) == {"v": 2}
+    assert get_entry(server.cache) is None
+
+
+def test_serves_stale_within_max_stale(server, monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_STALE", "600")
+    server.responses = [FakeResponse(body='{"v": 1}'), requests.exceptions.ConnectionError("down")]
+    utility.get_json_from_url(URL, {}, "weather", 60)
+    age_entry(server.cache, 300)
+
+    assert utility.get_json_from_url(URL, {}, "weather", 60) == {"v": 1}
+
+
+def test_raises_past_max_stale(server, monkeypatch):
+    monkeypatch.setenv("HTTP_MAX_STALE", "600")
+    server.responses = [FakeResponse(body='{"v": 1}'), requests.exceptions.ConnectionError("down")]
+    utility.get_json_from_url(URL, {}, "weather", 60)
+    age_entry(server.cache, 1000)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        utility.get_json_from_url(URL, {}, "weather", 60)
+
+
+def test_broken_body_never_replaces_a_good_one(server):
+    server.responses = [FakeResponse(body='{"v": 1}'), FakeResponse(body="<html>Log in to the Wi-Fi</html>")]
+    utility.get_json_from_url(URL, {}, "weather", 60)
+    age_entry(server.cache, 300)
+
+    assert utility.get_json_from_url(URL, {}, "weather", 60) == {"v": 1}
+    with open(server.cache.get_filename(get_cache_key(URL, {})), encoding='utf-8') as body_file:
+        assert json.load(body_file) == {"v": 1}
+
+
+def test_hits_are_saved_for_eviction(tmp_path):
+    cache = HttpCache(str(tmp_path))
+    cache.store("a", URL, "{}", 60)
+    cache.entries["a"]["used"] = 0
+    cache.save()
+
+    cache.read("a")
+    cache.save_if_used()
+    assert HttpCache(str(tmp_path)).get_entry("a")["used"] > 0
@@ -0,0 +1,101 @@
+"""
+Fonts and text measurements for the screens drawn with Pillow instead of from an SVG template,
+such as the literature clock and the word clock. Fonts are loaded once per path and size, and the
+width and height of a piece of text are measured once, so wrapping and fitting text can try many sizes cheaply.
+"""
+import logging
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+
+@lru_cache(maxsize=None)
+def get_font(font_path, size):
+    """
+    Return the font at `font_path` in `size` pixels, or Pillow's default font if it can't be loaded
+    """
+    try:
+        return ImageFont.truetype(font_path, size)
+    except OSError:
+        logging.error("Failed to load font {}. Using default font.".format(font_path))
+        return ImageFont.load_default()
+
+
+@lru_cache(maxsize=8192)
+def get_text_length(font_path, size, text):
+    """
+    How far `text` advances the pen, in pixels
+    """
+    return get_font(font_path, size).getlength(text)
+
+
+@lru_cache(maxsize=8192)
+def get_line_height(font_path, size, text):
+    """
+    The bottom of `text`'s bounding box, measured from the top of the line
+    """
+    return get_font(font_path, size).getbbox(text)[3]
+
+
+@lru_cache(maxsize=1024)
+def get_glyph_mask(font_path, size, text):
+    """
+    Return `text` rendered once as an 'L' mask cropped to its ink, and the mask's offset from where the text is drawn.
+    Paste a colour through the mask instead of drawing the same text again.
+    """
+    font = get_font(font_path, size)
+    bbox = font.getbbox(text)
+    mask = Image.new('L', (max(1, bbox[2] - bbox[0]), max(1, bbox[3] - bbox[1])), 0)
+    ImageDraw.Draw(mask).text((-bbox[0], -bbox[1]), text, fill=255, font=font)
+    return mask, bbox[0], bbox[1]
+
+
+def draw_text(image, position, text, font_path, size, fill):
+    """
+    Draw `text` onto `image` at `position` like ImageDraw.text, from the cached glyph mask
+    """
+    mask, offset_x, offset_y = get_glyph_mask(font_path, size, text)
+    image.paste(fill, (int(position[0]) + offset_x, int(position[1]) + offset_y), mask)
+
+
+def wrap_text(text, font_path, size, max_width, markup=""):
+    """
+    Split `text` into lines no wider than `max_width` pixels, breaking between words.
+    Characters in `markup` are kept in the lines but not measured, since they aren't drawn.
+    A word wider than `max_width` gets a line of its own.
+    """
+    space = get_text_length(font_path, size, " ")
+    lines = []
+    for paragraph in text.split("\n"):
+        line, line_width = [], 0
+        for word in paragraph.split():
+            measured = word
+            for character in markup:
+                measured = measured.replace(character, "")
+            word_width = get_text_length(font_path, size, measured)
+            if line and line_width + space + word_width > max_width:
+                lines.append(" ".join(line))
+                line, line_width = [], 0
+            line_width += (space if line else 0) + word_width
+            line.append(word)
+        if line:
+            lines.append(" ".join(line))
+    return lines
+
+
+def get_lines_height(lines, font_path, size, line_spacing=1.2):
+    return sum(get_line_height(font_path, size, line) for line in lines) * line_spacing
+
+
+def fit_font_size(fits, min_size, max_size):
+    """
+    Return the largest size from `min_size` to `max_size` for which `fits(size)` is true, or `min_size` if none is.
+    Text only gets bigger with the font, so this is a binary search.
+    """
+    low, high = min_size, max_size
+    while low < high:
+        size = (low + high + 1) // 2
+        if fits(size):
+            low = size
+        else:
+            high = size - 1
+    return low
@@ -1,7 +1,10 @@
 import codecs
 import logging
 import os
+import re
 import time
+import functools
+import threading
 from http.client import HTTPConnection
 import requests
 import datetime
@@ -11,6 +14,9 @@ import xml.etree.ElementTree as ET
 from astral import LocationInfo
 from astral.sun import sun
 import humanize
+import metrics
+from http_cache import get_http_cache, get_cache_key, get_ttl, get_freshness, is_storable
+from http_session import get_session
 import locale
 from babel.dates import format_time
 
@@ -47,6 +53,26 @@ def configure_logging():
     handler.setFormatter(formatter)
 
 
+@functools.lru_cache(maxsize=16)
+def get_placeholder_pattern(keys):
+    """
+    Compile a regex that matches any of the placeholder `keys`.
+    Longer keys are tried first, so CAL_DESC_10 is never mistaken for CAL_DESC_1 followed by a 0.
+    """
+    return re.compile("|".join(re.escape(key) for key in sorted(keys, key=len, reverse=True)))
+
+
+def fill_placeholders(text, output_dict):
+    """
+    Replace every key of `output_dict` found in `text` with its value, in a single pass.
+    Values are never scanned for placeholders, so the order of the keys doesn't matter.
+    """
+    if not output_dict:
+        return text
+    pattern = get_placeholder_pattern(tuple(sorted(output_dict)))
+    return pattern.sub(lambda match: output_dict[match.group(0)], text)
+
+
 # utilize a template svg as a base for output of values
 def update_svg(template_svg_filename, output_svg_filename, output_dict):
     """
@@ -60,7 +86,7 @@ def update_svg(template_svg_filename, output_svg_filename, output_dict):
     for output_key in output_dict:
         logging.debug("update_svg() - {} -> {}"
                       .format(output_key, output_dict[output_key]))
-        output = output.replace(output_key, output_dict[output_key])
+    output = fill_placeholders(output, output_dict)
 
     logging.debug("update_svg() - Write to SVG {}".format(output_svg_filename))
 
@@ -84,63 +110,212 @@ def is_stale(filepath, ttl):
     return verdict
 
 
-def get_json_from_url(url, headers, cache_file_name, ttl):
+def is_cache_stale(cache_file_name, ttl):
     """
-    Perform an HTTP GET for a `url` with optional `headers`.
-    Caches the response in `cache_file_name` for `ttl` seconds.
-    Returns the response as JSON
+    Like is_stale, and counts the lookup in the metrics as a cache hit, miss or stale
+    """
+    verdict = is_stale(cache_file_name, ttl)
+    metrics.count_cache(cache_file_name, "hit" if not verdict else "stale" if os.path.isfile(cache_file_name) else "miss")
+    return verdict
+
+
+def http_get(url, headers=None):
     """
-    response_json = False
+    A GET with the shared session, recording the size and time of the download in the metrics
+    """
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, headers=headers)
+    except requests.exceptions.RequestException:
+        metrics.record_http(url, 0, time.perf_counter() - start)
+        raise
+    metrics.record_http(url, len(response.content), time.perf_counter() - start, response.status_code)
+    return response
+
+
+# What json.loads and ET.fromstring raise for a body that isn't JSON or XML
+PARSE_ERRORS = (ValueError, ET.ParseError)
+
+
+def read_cached(cache, key, parse):
+    """
+    Return the cached response for `key` parsed with `parse`, or None if it isn't there or can't be parsed.
+    One that can't be parsed is removed, so it's fetched again.
+    """
+    body = cache.read(key)
+    if body is None:
+        return None
+    try:
+        return parse(body)
+    except PARSE_ERRORS as error:
+        logging.warning("The cached response can't be read, removing it. {}".format(error))
+        cache.remove(key)
+        cache.save()
+        return None
 
-    if (is_stale(cache_file_name, ttl)):
-        logging.info("Cache file is stale. Fetching from source.")
+
+def fetch_into_cache(cache, key, url, headers, parse, ttl, min_ttl=None, max_ttl=None):
+    """
+    Fetch `url` and store it in the cache under `key`, asking for it only if it has changed since the cached entry.
+    A response is only stored once `parse` has read it, so a broken body never replaces a good one.
+    Returns the parsed response, and whether it was a "miss", "stale" or "revalidated" cache lookup
+    """
+    entry = cache.get_entry(key)
+    request_headers = dict(headers or {})
+    if entry:
+        # Ask the server to answer 304 Not Modified, without the body, if what we have is still current
+        if entry.get("etag"):
+            request_headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            request_headers["If-Modified-Since"] = entry["last_modified"]
+
+    response = http_get(url, headers=request_headers)
+    if entry and response.status_code == 304:
+        logging.info("Not modified, renewing the cache entry.")
+        parsed = read_cached(cache, key, parse)
+        if parsed is None:
+            # Removed since, by another fetch, so get the whole response
+            return fetch_into_cache(cache, key, url, headers, parse, ttl, min_ttl, max_ttl)
+        # A 304 that doesn't say how long the response is good for leaves it as long as it was
+        renewed_ttl = entry["ttl"] if get_freshness(response.headers) is None else get_ttl(response.headers, ttl, min_ttl, max_ttl)
+        cache.renew(key, renewed_ttl,
+                    etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+        return parsed, "revalidated"
+
+    try:
+        response.raise_for_status()
+        parsed = parse(response.text)
+    except (requests.exceptions.HTTPError,) + PARSE_ERRORS:
+        logging.error(response.text)
+        logging.error(response.headers)
+        raise
+
+    if not is_storable(response.headers):
+        logging.info("The server says not to cache {}.".format(url))
+        cache.remove(key)
+        cache.save()
+        return parsed, "stale" if entry else "miss"
+    cache.store(key, url, response.text, get_ttl(response.headers, ttl, min_ttl, max_ttl),
+                etag=response.headers.get("ETag"), last_modified=response.headers.get("Last-Modified"))
+    return parsed, "stale" if entry else "miss"
+
+
+# Keys being fetched in the background, so each is only fetched once at a time, and the threads fetching them
+_refreshing = set()
+_refresh_threads = []
+_refreshing_lock = threading.Lock()
+
+
+def refresh_in_background(cache, key, url, headers, cache_name, parse, ttl, min_ttl=None, max_ttl=None):
+    """
+    Fetch `url` into the cache in a thread, for this run to finish with if it's still going, or for the next run
+    """
+    with _refreshing_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+
+    def refresh():
         try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            response_data = response.text
-            response_json = json.loads(response_data)
-            with open(cache_file_name, 'w') as text_file:
-                json.dump(response_json, text_file, indent=4)
+            fetch_into_cache(cache, key, url, headers, parse, ttl, min_ttl, max_ttl)
+            logging.info("Refreshed {} in the background.".format(url))
         except Exception as error:
-            logging.error(error)
-            logging.error(response.text)
-            logging.error(response.headers)
+            logging.warning("Could not refresh {} in the background. {}".format(url, error))
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(key)
+
+    # A daemon thread, so that a refresh still going after wait_for_refreshes() doesn't keep the process running.
+    # The cache writes each file in full and then renames it, so cutting a refresh off leaves the old response,
+    # and the next run fetches it again.
+    thread = threading.Thread(target=refresh, name="refresh {}".format(cache_name), daemon=True)
+    with _refreshing_lock:
+        _refresh_threads.append(thread)
+    thread.start()
+
+
+def wait_for_refreshes(timeout=None):
+    """
+    Wait for the background refreshes to finish, for up to `timeout` seconds altogether.
+    Any still going after that are cut off when the process exits.
+    """
+    with _refreshing_lock:
+        threads = list(_refresh_threads)
+        _refresh_threads.clear()
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join(None if timeout is None else max(0, timeout - (time.perf_counter() - start)))
+        if thread.is_alive():
+            logging.warning("Gave up waiting to {} in the background, the next run will fetch it again".format(thread.name))
+
+
+def get_parsed_from_url(url, headers, cache_name, parse, ttl, min_ttl=None, max_ttl=None):
+    """
+    Perform an HTTP GET for a `url` with optional `headers`, and return the body read with `parse`.
+    The response is kept in the HTTP cache, by URL and headers, for as long as its Cache-Control or Expires header says,
+    between `min_ttl` and `max_ttl` seconds. If it has neither, it's kept for `ttl` seconds.
+    After that, for up to HTTP_MAX_STALE seconds, the old response is used if the source can't be reached or sends
+    something that can't be parsed, or straight away while it's fetched again in the background if
+    HTTP_STALE_WHILE_REVALIDATE is set.
+    `cache_name` is what the lookups are counted as in the metrics.
+    """
+    cache = get_http_cache()
+    key = get_cache_key(url, headers)
+    entry = cache.get_entry(key)
+
+    if entry and cache.is_fresh(entry):
+        parsed = read_cached(cache, key, parse)
+        if parsed is not None:
+            metrics.count_cache(cache_name, "hit")
+            logging.info("Found in cache.")
+            return parsed
+        entry = None
+
+    max_stale = float(os.getenv("HTTP_MAX_STALE", 6 * 60 * 60))
+    usable = entry is not None and cache.is_fresh(entry, max_stale=max_stale)
+
+    if usable and os.getenv("HTTP_STALE_WHILE_REVALIDATE", "0") == "1":
+        parsed = read_cached(cache, key, parse)
+        if parsed is not None:
+            metrics.count_cache(cache_name, "served_stale")
+            logging.info("Cache entry is stale. Using it while fetching from source in the background.")
+            refresh_in_background(cache, key, url, headers, cache_name, parse, ttl, min_ttl, max_ttl)
+            return parsed
+
+    logging.info("Cache entry is stale. Fetching from source.")
+    try:
+        parsed, outcome = fetch_into_cache(cache, key, url, headers, parse, ttl, min_ttl, max_ttl)
+    except (requests.exceptions.RequestException,) + PARSE_ERRORS as error:
+        logging.error(error)
+        parsed = read_cached(cache, key, parse) if usable else None
+        if parsed is None:
             raise
-    else:
-        logging.info("Found in cache.")
-        with open(cache_file_name, 'r') as file:
-            return json.loads(file.read())
-    return response_json
+        metrics.count_cache(cache_name, "served_stale")
+        logging.warning("Using the cached response from {} instead.".format(
+            datetime.datetime.fromtimestamp(entry["fetched"]).isoformat(timespec='seconds')))
+        return parsed
+    metrics.count_cache(cache_name, outcome)
+    return parsed
 
 
-def get_xml_from_url(url, headers, cache_file_name, ttl):
+def get_json_from_url(url, headers, cache_name, ttl, min_ttl=None, max_ttl=None):
     """
     Perform an HTTP GET for a `url` with optional `headers`.
-    Caches the response in `cache_file_name` for `ttl` seconds.
-    Returns the response as an XML ElementTree object
+    Caches the response as get_parsed_from_url does.
+    Returns the response as JSON
     """
-    logging.info(url)
+    return get_parsed_from_url(url, headers, cache_name, json.loads, ttl, min_ttl, max_ttl)
 
-    if (is_stale(cache_file_name, ttl)):
-        logging.info("Cache file is stale. Fetching from source.")
-        try:
-            response = requests.get(url, headers=headers)
-            response.raise_for_status()
-            response_data = response.text
 
-            with open(cache_file_name, 'w') as text_file:
-                text_file.write(response_data)
-        except Exception as error:
-            logging.error(error)
-            logging.error(response.text)
-            logging.error(response.headers)
-            raise
-    else:
-        logging.info("Found in cache.")
-        with open(cache_file_name, 'r') as file:
-            response_data = file.read()
-    response_xml = ET.fromstring(response_data)
-    return response_xml
+def get_xml_from_url(url, headers, cache_name, ttl, min_ttl=None, max_ttl=None):
+    """
+    Perform an HTTP GET for a `url` with optional `headers`.
+    Caches the response as get_parsed_from_url does.
+    Returns the response as an XML ElementTree object
+    """
+    logging.info(url)
+    return get_parsed_from_url(url, headers, cache_name, ET.fromstring, ttl, min_ttl, max_ttl)
 
 
 def get_formatted_time(dt):
@@ -10,7 +10,11 @@ import pytz
 
 class BaseWeatherProvider(ABC):
 
+    # How long to cache responses for when the server doesn't say,
+    # and the shortest and longest to cache them for when it does
     ttl = float(os.getenv("WEATHER_TTL", 1 * 60 * 60))
+    min_ttl = float(os.getenv("WEATHER_MIN_TTL", 5 * 60))
+    max_ttl = float(os.getenv("WEATHER_MAX_TTL", 6 * 60 * 60))
 
     @abstractmethod
     def get_weather(self):
@@ -57,15 +61,17 @@ class BaseWeatherProvider(ABC):
     def get_response_json(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for WEATHER_TTL seconds.
+        Caches the response for as long as the server says, between WEATHER_MIN_TTL and WEATHER_MAX_TTL seconds,
+        or for WEATHER_TTL seconds if it doesn't say.
         Returns the response as JSON
         """
-        return get_json_from_url(url, headers, "cache_weather.json", self.ttl)
+        return get_json_from_url(url, headers, "weather", self.ttl, self.min_ttl, self.max_ttl)
 
     def get_response_xml(self, url, headers={}):
         """
         Perform an HTTP GET for a `url` with optional `headers`.
-        Caches the response in `cache_file_name` for WEATHER_TTL seconds.
+        Caches the response for as long as the server says, between WEATHER_MIN_TTL and WEATHER_MAX_TTL seconds,
+        or for WEATHER_TTL seconds if it doesn't say.
         Returns the response as an XML ElementTree
         """
-        return get_xml_from_url(url, headers, "cache_weather.xml", self.ttl)
+        return get_xml_from_url(url, headers, "weather", self.ttl, self.min_ttl, self.max_ttl)
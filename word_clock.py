@@ -1,113 +1,212 @@
+"""
+A word clock: a grid of letters where the words that spell out the time, to the nearest five minutes, are lit in red.
+
+The letter grid is drawn once as a base layer, and each word once as a mask. A frame is made by OR-ing the masks
+of the lit words together, so it never draws any text. Frames are kept in the frame store as they're made, and
+all of them can be made in advance with:
+    python3 word_clock.py --prerender
+"""
+import sys
 import logging
 from datetime import datetime
-from PIL import Image, ImageDraw, ImageFont
+from functools import lru_cache
+from PIL import Image, ImageChops
 from utility import configure_logging
+from text_render import get_glyph_mask
+from frame_store import FrameStore, get_key
 
 configure_logging()
 
-class SentenceClock:
-    def __init__(self):
-        self.letters = [
-            ['I', 'T', 'R', 'I', 'S', 'U', 'H', 'A', 'L', 'F', 'T', 'E', 'N'],
-            ['Q', 'U', 'A', 'R', 'T', 'E', 'R', 'T', 'W', 'E', 'N', 'T', 'Y'],
-            ['F', 'I', 'V', 'E', 'Q', 'M', 'I', 'N', 'U', 'T', 'E', 'S', 'T'],
-            ['P', 'A', 'S', 'T', 'M', 'T', 'O', 'S', 'A', 'M', 'O', 'P', 'M'],
-            ['O', 'N', 'E', 'N', 'T', 'W', 'O', 'Z', 'T', 'H', 'R', 'E', 'E'],
-            ['F', 'O', 'U', 'R', 'F', 'I', 'V', 'E', 'S', 'E', 'V', 'E', 'N'],
-            ['S', 'I', 'X', 'E', 'I', 'G', 'H', 'T', 'Y', 'N', 'I', 'N', 'E'],
-            ['T', 'E', 'N', 'E', 'L', 'E', 'V', 'E', 'N', 'P', 'H', 'I', 'L'],
-            ['T', 'W', 'E', 'L', 'V', 'E', 'L', 'O', 'C', 'L', 'O', 'C', 'K'],
-        ]
-        self.image = Image.new("RGB", (800, 480), "white")
-        self.draw = ImageDraw.Draw(self.image)
-        try:
-            self.font = ImageFont.truetype("/usr/share/fonts/truetype/DejaVuSans.ttf", 40)
-            logging.info("Font loaded successfully.")
-        except IOError:
-            logging.warning("Font file not found. Using default font.")
-            self.font = ImageFont.load_default()
-        self.update_clock()
-        self.export_as_png()
-
-    def update_clock(self):
-        now = datetime.now()
-        hours = now.hour % 12
-        minutes = now.minute
-
-        self.draw_all_letters()
-        self.highlight_letters([(0, 0), (0, 1), (0, 3), (0, 4)], color="red")  # IT IS
-
-        self.highlight_minutes(minutes)
-        self.highlight_past_to(minutes)
-        self.highlight_hours(hours, minutes)
-        self.highlight_oclock(minutes)
-
-    def draw_all_letters(self):
-        for i, row in enumerate(self.letters):
-            for j, letter in enumerate(row):
-                x = j * 60 + 20
-                y = i * 50 + 20
-                self.draw.text((x, y), letter, fill="black", font=self.font)
-
-    def highlight_minutes(self, minutes):
-        minute_mappings = {
-            range(5, 10): [(2, 0), (2, 1), (2, 2), (2, 3)],  # FIVE
-            range(10, 15): [(0, 9), (0, 10), (0, 11)],  # TEN
-            range(15, 20): [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6)],  # QUARTER
-            range(20, 25): [(1, 7), (1, 8), (1, 9), (1, 10), (1, 11)],  # TWENTY
-            range(25, 30): [(1, 7), (1, 8), (1, 9), (1, 10), (1, 11), (2, 0), (2, 1), (2, 2), (2, 3)],  # TWENTY FIVE
-            range(30, 35): [(0, 6), (0, 7), (0, 8)],  # HALF
-            range(35, 40): [(1, 7), (1, 8), (1, 9), (1, 10), (1, 11), (2, 0), (2, 1), (2, 2), (2, 3)],  # TWENTY FIVE
-            range(40, 45): [(1, 7), (1, 8), (1, 9), (1, 10), (1, 11)],  # TWENTY
-            range(45, 50): [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6)],  # QUARTER
-            range(50, 55): [(0, 9), (0, 10), (0, 11)],  # TEN
-            range(55, 60): [(2, 0), (2, 1), (2, 2), (2, 3)],  # FIVE
-        }
-        for minute_range, indices in minute_mappings.items():
-            if minutes in minute_range:
-                self.highlight_letters(indices, color="red")
-                break
-
-    def highlight_past_to(self, minutes):
-        if 5 <= minutes < 35:
-            self.highlight_letters([(3, 0), (3, 1), (3, 2), (3, 3)], color="red")  # PAST
-        elif minutes >= 35:
-            self.highlight_letters([(3, 5), (3, 6)], color="red")  # TO
-
-    def highlight_hours(self, hours, minutes):
-        if minutes >= 35:
-            hours = (hours + 1) % 12
-            if hours == 0:
-                hours = 12
-        hour_mapping = {
-            1: [(4, 0), (4, 1), (4, 2)],
-            2: [(4, 5), (4, 6), (4, 7)],
-            3: [(4, 9), (4, 10), (4, 11), (4, 12)],
-            4: [(5, 0), (5, 1), (5, 2), (5, 3)],
-            5: [(5, 4), (5, 5), (5, 6), (5, 7)],
-            6: [(6, 0), (6, 1), (6, 2)],
-            7: [(5, 8), (5, 9), (5, 10), (5, 11), (5, 12)],
-            8: [(6, 4), (6, 5), (6, 6), (6, 7)],
-            9: [(6, 8), (6, 9), (6, 10), (6, 11)],
-            10: [(7, 0), (7, 1), (7, 2)],
-            11: [(7, 4), (7, 5), (7, 6), (7, 7), (7, 8), (7, 9)],
-            12: [(8, 0), (8, 1), (8, 2), (8, 3), (8, 4), (8, 5)],
-        }
-        self.highlight_letters(hour_mapping[hours], color="red")
-
-    def highlight_oclock(self, minutes):
-        if minutes == 0:
-            self.highlight_letters([(8, 6), (8, 7), (8, 8), (8, 9), (8, 10), (8, 11), (8, 12)], color="red")
-
-    def highlight_letters(self, indices, color="red"):
-        for i, j in indices:
-            x = j * 60 + 20  # Increased horizontal spacing
-            y = i * 50 + 20  # Increased vertical spacing
-            self.draw.text((x, y), self.letters[i][j], fill=color, font=self.font)
-
-    def export_as_png(self):
-        self.image.save("sentence_clock.png")
-        logging.info("Exported sentence_clock.png")
+FONT_PATH = "/usr/share/fonts/truetype/DejaVuSans.ttf"
+FONT_SIZE = 40
+
+IMAGE_WIDTH = 800
+IMAGE_HEIGHT = 480
+OUTPUT_FILENAME = "sentence_clock.png"
+
+# Where the letters go
+CELL_WIDTH = 60
+CELL_HEIGHT = 50
+MARGIN = 20
+
+# How much of a pixel a letter has to cover to be ink on the screen
+INK_THRESHOLD = 128
+
+LETTERS = [
+    ['I', 'T', 'R', 'I', 'S', 'U', 'H', 'A', 'L', 'F', 'T', 'E', 'N'],
+    ['Q', 'U', 'A', 'R', 'T', 'E', 'R', 'T', 'W', 'E', 'N', 'T', 'Y'],
+    ['F', 'I', 'V', 'E', 'Q', 'M', 'I', 'N', 'U', 'T', 'E', 'S', 'T'],
+    ['P', 'A', 'S', 'T', 'M', 'T', 'O', 'S', 'A', 'M', 'O', 'P', 'M'],
+    ['O', 'N', 'E', 'N', 'T', 'W', 'O', 'Z', 'T', 'H', 'R', 'E', 'E'],
+    ['F', 'O', 'U', 'R', 'F', 'I', 'V', 'E', 'S', 'E', 'V', 'E', 'N'],
+    ['S', 'I', 'X', 'E', 'I', 'G', 'H', 'T', 'Y', 'N', 'I', 'N', 'E'],
+    ['T', 'E', 'N', 'E', 'L', 'E', 'V', 'E', 'N', 'P', 'H', 'I', 'L'],
+    ['T', 'W', 'E', 'L', 'V', 'E', 'L', 'O', 'C', 'L', 'O', 'C', 'K'],
+]
+
+# The (row, column) of each letter of each word
+WORDS = {
+    "IT_IS": [(0, 0), (0, 1), (0, 3), (0, 4)],
+    "FIVE_MINUTES": [(2, 0), (2, 1), (2, 2), (2, 3)],
+    "TEN_MINUTES": [(0, 9), (0, 10), (0, 11)],
+    "QUARTER": [(1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6)],
+    "TWENTY": [(1, 7), (1, 8), (1, 9), (1, 10), (1, 11)],
+    "HALF": [(0, 6), (0, 7), (0, 8)],
+    "PAST": [(3, 0), (3, 1), (3, 2), (3, 3)],
+    "TO": [(3, 5), (3, 6)],
+    "ONE": [(4, 0), (4, 1), (4, 2)],
+    "TWO": [(4, 5), (4, 6), (4, 7)],
+    "THREE": [(4, 9), (4, 10), (4, 11), (4, 12)],
+    "FOUR": [(5, 0), (5, 1), (5, 2), (5, 3)],
+    "FIVE": [(5, 4), (5, 5), (5, 6), (5, 7)],
+    "SIX": [(6, 0), (6, 1), (6, 2)],
+    "SEVEN": [(5, 8), (5, 9), (5, 10), (5, 11), (5, 12)],
+    "EIGHT": [(6, 4), (6, 5), (6, 6), (6, 7)],
+    "NINE": [(6, 8), (6, 9), (6, 10), (6, 11)],
+    "TEN": [(7, 0), (7, 1), (7, 2)],
+    "ELEVEN": [(7, 4), (7, 5), (7, 6), (7, 7), (7, 8), (7, 9)],
+    "TWELVE": [(8, 0), (8, 1), (8, 2), (8, 3), (8, 4), (8, 5)],
+    "OCLOCK": [(8, 6), (8, 7), (8, 8), (8, 9), (8, 10), (8, 11), (8, 12)],
+}
+
+# The words for each five minutes past the hour
+MINUTE_WORDS = [
+    [],
+    ["FIVE_MINUTES"],
+    ["TEN_MINUTES"],
+    ["QUARTER"],
+    ["TWENTY"],
+    ["TWENTY", "FIVE_MINUTES"],
+    ["HALF"],
+    ["TWENTY", "FIVE_MINUTES"],
+    ["TWENTY"],
+    ["QUARTER"],
+    ["TEN_MINUTES"],
+    ["FIVE_MINUTES"],
+]
+
+HOUR_WORDS = ["TWELVE", "ONE", "TWO", "THREE", "FOUR", "FIVE", "SIX", "SEVEN", "EIGHT", "NINE", "TEN", "ELEVEN"]
+
+
+def get_lit_words(hours, minutes):
+    """
+    The words that spell out `hours`:`minutes`, eg IT IS TWENTY PAST FOUR
+    """
+    words = ["IT_IS"] + MINUTE_WORDS[minutes // 5]
+    if 5 <= minutes < 35:
+        words.append("PAST")
+    elif minutes >= 35:
+        words.append("TO")
+        hours += 1
+    words.append(HOUR_WORDS[hours % 12])
+    if minutes == 0:
+        words.append("OCLOCK")
+    return words
+
+
+def get_all_states():
+    """
+    Every different set of lit words the clock can show
+    """
+    states = []
+    for hours in range(12):
+        for minutes in list(range(0, 60, 5)) + [1]:
+            words = get_lit_words(hours, minutes)
+            if words not in states:
+                states.append(words)
+    return states
+
+
+def _get_cells_mask(cells):
+    """
+    An 'L' mask of the letters in `cells`, 255 where they're ink and 0 elsewhere
+    """
+    mask = Image.new('L', (IMAGE_WIDTH, IMAGE_HEIGHT), 0)
+    for row, column in cells:
+        glyph, offset_x, offset_y = get_glyph_mask(FONT_PATH, FONT_SIZE, LETTERS[row][column])
+        ink = glyph.point(lambda value: 255 if value >= INK_THRESHOLD else 0)
+        position = (column * CELL_WIDTH + MARGIN + offset_x, row * CELL_HEIGHT + MARGIN + offset_y)
+        mask.paste(255, position, ink)
+    return mask
+
+
+@lru_cache(maxsize=None)
+def get_base_mask():
+    """
+    The whole letter grid
+    """
+    return _get_cells_mask([(row, column) for row in range(len(LETTERS)) for column in range(len(LETTERS[row]))])
+
+
+@lru_cache(maxsize=None)
+def get_word_mask(word):
+    return _get_cells_mask(WORDS[word])
+
+
+def render_words(words):
+    """
+    Return the clock with `words` lit, as an RGB image of pure black, red and white
+    """
+    red = Image.new('L', (IMAGE_WIDTH, IMAGE_HEIGHT), 0)
+    for word in words:
+        red = ImageChops.lighter(red, get_word_mask(word))
+    black = ImageChops.subtract(get_base_mask(), red)
+
+    image = Image.new("RGB", (IMAGE_WIDTH, IMAGE_HEIGHT), "white")
+    image.paste((0, 0, 0), mask=black)
+    image.paste((255, 0, 0), mask=red)
+    return image
+
+
+def get_frame_store():
+    return FrameStore("wordclock", [FONT_PATH, FONT_SIZE, IMAGE_WIDTH, IMAGE_HEIGHT, CELL_WIDTH, CELL_HEIGHT,
+                                    MARGIN, INK_THRESHOLD, LETTERS])
+
+
+def get_frame_name(words):
+    return "-".join(words).lower()
+
+
+def get_frame_filename(words, store=None):
+    """
+    Return the filename of the frame with `words` lit, rendering it into the frame store if it isn't there yet
+    """
+    store = store or get_frame_store()
+    frame_name = get_frame_name(words)
+    filename = store.find(frame_name, get_key(words))
+    if not filename:
+        logging.info("Rendering word clock frame {}".format(frame_name))
+        store.add(frame_name, get_key(words), render_words(words))
+        store.save()
+        filename = store.get_filename(frame_name)
+    return filename
+
+
+def prerender_frames():
+    store = get_frame_store()
+    for words in get_all_states():
+        if not store.has(get_frame_name(words), get_key(words)):
+            store.add(get_frame_name(words), get_key(words), render_words(words))
+    store.save()
+    logging.info("Word clock frames are in {}".format(store.directory))
+
+
+def get_word_clock(now=None):
+    """
+    Return the filename of the frame showing the time `now`
+    """
+    now = now or datetime.now()
+    return get_frame_filename(get_lit_words(now.hour, now.minute))
+
+
+def main():
+    now = datetime.now()
+    render_words(get_lit_words(now.hour, now.minute)).save(OUTPUT_FILENAME)
+    logging.info("Exported {}".format(OUTPUT_FILENAME))
+
 
 if __name__ == "__main__":
-    app = SentenceClock()
+    if sys.argv[1:] == ["--prerender"]:
+        prerender_frames()
+    else:
+        main()
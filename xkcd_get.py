@@ -1,8 +1,8 @@
-import requests
 import logging
 import os
 from PIL import Image
 from utility import is_stale, configure_logging
+from http_session import get_session
 import sys
 
 configure_logging()
@@ -14,7 +14,7 @@ def xkcd_get_img():
         sys.exit(1)
 
     logging.info("Downloading xkcd-json")
-    response = requests.get("https://xkcd.com/info.0.json")
+    response = get_session().get("https://xkcd.com/info.0.json")
     result = response.json()
 
     logging.info("Downloading xkcd_img")
@@ -24,7 +24,7 @@ def xkcd_get_img():
     filename = path + '/' + os.path.basename(xkcd_file_name)
     if os.path.exists(filename):
         os.remove(filename)
-    image_response = requests.get(result["img"])
+    image_response = get_session().get(result["img"])
     open(filename, 'wb').write(image_response.content)
 
     logging.info("Resizing the image to fit the screen. Disortions can happen.")